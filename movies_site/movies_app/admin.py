@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.db import models
+from .forms import SandboxedImageField
 from .models import Movie, Category, Comment, Profile, Favorite
 
+# Uploads made here are decoded in the imaging sandbox too.
+IMAGE_FIELD_OVERRIDES = {models.ImageField: {'form_class': SandboxedImageField}}
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
@@ -12,6 +17,7 @@ class MovieAdmin(admin.ModelAdmin):
     list_filter = ('category', 'created_by')
     search_fields = ('title', 'actors', 'description')
     prepopulated_fields = {'slug': ('title',)}
+    formfield_overrides = IMAGE_FIELD_OVERRIDES
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -22,6 +28,7 @@ class CommentAdmin(admin.ModelAdmin):
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'bio')
+    formfield_overrides = IMAGE_FIELD_OVERRIDES
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
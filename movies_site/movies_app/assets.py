@@ -0,0 +1,107 @@
+"""
+Fingerprinted, precompressed static files.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` copies each
+file to ``STATIC_ROOT`` under a content-hashed name (``base.3f2a91c0d4e1.css``),
+as ``ManifestStaticFilesStorage`` does, and writes ``.gz`` and -- when the
+optional ``brotli`` package is installed -- ``.br`` siblings of the text
+assets next to it.  ``{% static %}`` then links the hashed name.
+
+``serve_static()`` picks the best sibling the client's ``Accept-Encoding``
+allows and serves it through ``media.serve_file()``, so nothing is
+compressed per request and hashed names are cached as immutable.
+"""
+import functools
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from .media import IMMUTABLE_MAX_AGE, MUTABLE_MAX_AGE, serve_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.xml', '.html'}
+
+# Best first: the first one the client accepts is served.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz')) if brotli else (('gzip', '.gz'),)
+
+COMPRESSORS = {
+    'br': lambda data: brotli.compress(data, quality=11),
+    'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+}
+
+
+def is_compressible(name):
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if is_compressible(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        for encoding, suffix in ENCODINGS:
+            compressed = COMPRESSORS[encoding](data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            # Tiny files can grow; serving them as is is cheaper then.
+            if len(compressed) < len(data):
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def accepted_encodings(header):
+    accepted, refused = set(), set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            refused.add(coding)
+        else:
+            accepted.add(coding)
+    if '*' in accepted:
+        accepted.update(encoding for encoding, _suffix in ENCODINGS)
+    return accepted - refused
+
+
+@functools.cache
+def hashed_names():
+    # The manifest only changes with a deploy, which restarts the process.
+    return frozenset(staticfiles_storage.hashed_files.values())
+
+
+@require_safe
+def serve_static(request, path):
+    name = path
+    if is_compressible(path):
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for encoding, suffix in ENCODINGS:
+            try:
+                if encoding in accepted and os.path.isfile(safe_join(settings.STATIC_ROOT, path + suffix)):
+                    name = path + suffix
+                    break
+            except SuspiciousFileOperation:
+                break
+    hashed = path in hashed_names()
+    max_age = IMMUTABLE_MAX_AGE if hashed else MUTABLE_MAX_AGE
+    response = serve_file(
+        request, settings.STATIC_ROOT, name, settings.STATIC_ACCEL_PREFIX, max_age, immutable=hashed)
+    if is_compressible(path):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
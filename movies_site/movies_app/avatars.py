@@ -0,0 +1,91 @@
+"""
+Square, fixed-size copies of profile avatars.
+
+An uploaded avatar is center-cropped to a square and written out at each
+size in ``AVATAR_SIZES`` (never upscaled), re-encoded as WebP when Pillow can
+encode it here.  ``Profile.avatar_variants`` records the result::
+
+    {'source': 'avatars/me.jpg', 'sizes': {'40': 'avatars/variants/me-40.webp', ...}}
+
+The original upload is never shown.  Until the image worker has built the
+variants (or if it can't), ``avatar_img`` renders the user's initial instead.
+"""
+import posixpath
+
+from django.core.files.base import ContentFile
+from PIL import features
+
+from . import caching, imaging
+from .models import ImageTask, Movie, Profile
+
+AVATAR_SIZES = (40, 80, 160)
+AVATAR_DIR = 'avatars/variants'
+FORMAT = 'webp' if features.check('webp') else 'jpeg'
+QUALITY = 80
+
+# Display size in CSS pixels; the next size up is offered for 2x screens.
+AVATAR_PRESETS = {
+    'small': 40,
+    'large': 80,
+}
+
+avatar_storage = Profile._meta.get_field('avatar').storage
+
+
+def build_variants(name):
+    """Write the avatar variants of the image stored as ``name``; storage only, decoded in the sandbox."""
+    source = imaging.stored_source(avatar_storage, name)
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    sizes = {}
+    for size, content in imaging.run(imaging.avatar_variants, source, AVATAR_SIZES, FORMAT, QUALITY):
+        sizes[str(size)] = avatar_storage.save(f'{AVATAR_DIR}/{stem}-{size}.{FORMAT}', ContentFile(content))
+    return {'source': name, 'sizes': sizes}
+
+
+def variant_paths(variants):
+    return set((variants or {}).get('sizes', {}).values())
+
+
+def variant_url(variants, size):
+    """URL of the smallest variant at least ``size`` pixels wide (or the largest there is), or ''."""
+    sizes = (variants or {}).get('sizes')
+    if not sizes:
+        return ''
+    available = sorted(int(key) for key in sizes)
+    best = next((key for key in available if key >= size), available[-1])
+    return avatar_storage.url(sizes[str(best)])
+
+
+def invalidate(user_id):
+    """Drop cached pages that show the user's avatar: the detail pages of movies they commented on."""
+    for slug in Movie.objects.filter(comments__user_id=user_id).values_list('slug', flat=True).distinct():
+        caching.bump_movie_version(slug)
+
+
+def apply_variants(profile_id, source, variants):
+    user_id = Profile.objects.filter(pk=profile_id, avatar=source).values_list('user_id', flat=True).first()
+    if user_id is None:
+        # The profile is gone or has a newer avatar.
+        return
+    # Replaced variant files may be shared with other profiles; gc_media removes orphans.
+    Profile.objects.filter(pk=profile_id, avatar=source).update(avatar_variants=variants)
+    invalidate(user_id)
+
+
+# ----------------------
+# Background processing (see image_tasks.py)
+# ----------------------
+def queue_variants(profile):
+    source = profile.avatar.name
+    task = {'kind': ImageTask.AVATAR, 'object_id': profile.pk, 'source': source}
+    if not ImageTask.objects.filter(status=ImageTask.PENDING, **task).exists():
+        ImageTask.objects.create(**task)
+
+
+def process_task(task):
+    apply_variants(task.object_id, task.source, build_variants(task.source))
+
+
+def fail_task(task):
+    # Nothing to record: without variants the initial keeps being shown.
+    pass
@@ -0,0 +1,106 @@
+"""
+Cache keys and versions shared by the movie views.
+
+Cached entries embed the catalogue version in their key.  Saving or deleting
+any Movie or Category bumps the version (see ``signals.py``), so stale entries
+are simply never read again and expire on their own.  Per-movie versions work
+the same way for a single movie and its comments.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+CATALOGUE_MODIFIED_KEY = 'catalogue:modified'
+COUNTERS_VERSION_KEY = 'counters:version'
+SEARCH_RESULTS_TIMEOUT = 60 * 15
+
+
+def _version(key, create=True):
+    version = cache.get(key)
+    if version is None and create:
+        # Start from the clock so a version lost to eviction is never reused.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    """Move a version on and return the new one."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def catalogue_version():
+    return _version(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version():
+    version = _bump(CATALOGUE_VERSION_KEY)
+    cache.set(CATALOGUE_MODIFIED_KEY, time.time(), None)
+    return version
+
+
+def catalogue_last_modified():
+    """Unix time of the last catalogue change; "now" if it is not known."""
+    modified = cache.get(CATALOGUE_MODIFIED_KEY)
+    if modified is None:
+        cache.add(CATALOGUE_MODIFIED_KEY, time.time(), None)
+        modified = cache.get(CATALOGUE_MODIFIED_KEY)
+    return modified
+
+
+def counters_version():
+    """Version of the comment and favorite counters, for pages sorted by them."""
+    return _version(COUNTERS_VERSION_KEY)
+
+
+def bump_counters_version():
+    _bump(COUNTERS_VERSION_KEY)
+
+
+def favorites_version(user_id):
+    """Version of one user's set of favorited movies."""
+    return _version('favorites:%s:version' % user_id)
+
+
+def bump_favorites_version(user_id):
+    _bump('favorites:%s:version' % user_id)
+
+
+def movie_version(slug, create=True):
+    """
+    Version of one movie's detail page: the movie itself and its comments.
+    Slugs come from URLs, so callers that have not yet seen the movie pass
+    ``create=False`` and get None rather than a never-expiring key for any
+    slug a client makes up.
+    """
+    return _version('movie:%s:version' % slug, create)
+
+
+def bump_movie_version(slug):
+    _bump('movie:%s:version' % slug)
+
+
+def _digest(*parts):
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def count_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return 'count:%s:%s' % (catalogue_version(), _digest(sql, params))
+
+
+def search_results_key(params, page_number):
+    query = ' '.join(params.get('q', '').lower().split())
+    facets = [(name, params.get(name, '')) for name in ('category', 'decade', 'rating')]
+    return 'search:%s:%s:%s' % (catalogue_version(), _digest(query, facets), page_number)
+
+
+def skeleton_key(path, version=''):
+    return 'donut:%s:%s:%s' % (catalogue_version(), version, _digest(path))
@@ -0,0 +1,90 @@
+"""
+Lightweight movie cards for the grid templates.
+
+``card_queryset()`` turns any Movie queryset into a ``values()`` queryset of
+only the columns a card shows (joined to the category name in the same
+query).  It can still be filtered, ordered and paginated; ``cards()`` then
+maps the rows of one page to slotted ``MovieCard`` objects with their detail
+URL already built, instead of full model instances.
+"""
+from django.urls import reverse
+
+from .models import Movie
+
+CARD_FIELDS = (
+    'id', 'title', 'slug', 'poster', 'rating', 'category__name', 'release_date', 'created_at', 'updated_at',
+    'comment_count', 'favorite_count', 'poster_status', 'poster_variants', 'poster_width', 'poster_height',
+    'poster_lqip',
+)
+
+_SLUG_PLACEHOLDER = 'movie-slug-placeholder'
+_detail_url_template = None
+
+
+def detail_url(slug):
+    # One reverse() per process; every card then only does a string replace.
+    global _detail_url_template
+    if _detail_url_template is None:
+        _detail_url_template = reverse('movie_detail', args=[_SLUG_PLACEHOLDER])
+    return _detail_url_template.replace(_SLUG_PLACEHOLDER, slug)
+
+
+_poster_storage = Movie._meta.get_field('poster').storage
+
+
+class MovieCard:
+    __slots__ = (
+        'id', 'title', 'slug', 'poster_url', 'rating', 'category_name', 'release_date', 'created_at',
+        'updated_at', 'comment_count', 'favorite_count', 'poster_status', 'poster_variants', 'poster_width',
+        'poster_height', 'poster_lqip', 'url',
+    )
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.title = row['title']
+        self.slug = row['slug']
+        self.poster_url = _poster_storage.url(row['poster']) if row['poster'] else ''
+        self.rating = row['rating']
+        self.category_name = row['category__name']
+        self.release_date = row['release_date']
+        self.created_at = row['created_at']
+        self.updated_at = row['updated_at']
+        self.comment_count = row['comment_count']
+        self.favorite_count = row['favorite_count']
+        self.poster_status = row['poster_status']
+        self.poster_variants = row['poster_variants']
+        self.poster_width = row['poster_width']
+        self.poster_height = row['poster_height']
+        self.poster_lqip = row['poster_lqip']
+        self.url = detail_url(row['slug'])
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __repr__(self):
+        return f'<MovieCard: {self.title}>'
+
+
+def card_queryset(queryset):
+    return queryset.values(*CARD_FIELDS)
+
+
+def cards(rows):
+    """``MovieCard``s for rows of a ``card_queryset()``."""
+    return [MovieCard(row) for row in rows]
+
+
+def cards_in_order(ids):
+    """Cards for ``ids`` in the given order, fetched with one query."""
+    by_id = {card.id: card for card in cards(card_queryset(Movie.objects.filter(pk__in=ids)))}
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+class MovieCardListMixin:
+    """ListView mixin for a ``card_queryset()``: the page's rows reach the template as ``MovieCard``s."""
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        page.object_list = object_list = cards(object_list)
+        return paginator, page, object_list, is_paginated
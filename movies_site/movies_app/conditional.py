@@ -0,0 +1,62 @@
+"""
+Conditional GET for the movie pages.
+
+Views compute cheap validators in ``get_etag()`` / ``get_last_modified()``;
+when the client already holds a matching copy it gets a 304 before any
+queryset or template work is done.  Pages are per user (the navbar, the
+favorite button), so every ETag mixes in the user and responses are marked
+private.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import caching
+
+
+def make_etag(*parts):
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    def get_etag(self):
+        return None
+
+    def get_last_modified(self):
+        """Unix timestamp of the last change, or None."""
+        return None
+
+    def get(self, request, *args, **kwargs):
+        etag = last_modified = None
+        # Queued messages are part of the page, so never answer 304 over them.
+        if not len(get_messages(request)):
+            etag = self.get_etag()
+            last_modified = self.get_last_modified()
+        if etag is not None:
+            etag = quote_etag(etag)
+        if last_modified is not None:
+            last_modified = int(last_modified)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag is not None and not response.has_header('ETag'):
+                response.headers['ETag'] = etag
+            if last_modified is not None and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class CatalogueConditionalMixin(ConditionalGetMixin):
+    """Validators for pages that change with the catalogue and the user's favorites."""
+
+    def get_etag(self):
+        user_id = self.request.user.pk
+        return make_etag(
+            caching.catalogue_version(), user_id, caching.favorites_version(user_id), self.request.get_full_path())
+
+    def get_last_modified(self):
+        return caching.catalogue_last_modified()
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .favorites import favorite_ids
+
+
+def favorites(request):
+    """The user's favorited movie ids, loaded only if a template asks for them."""
+    return {'favorite_ids': SimpleLazyObject(lambda: favorite_ids(request.user))}
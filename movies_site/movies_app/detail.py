@@ -0,0 +1,89 @@
+"""
+Assembled movie detail payloads.
+
+Everything the detail page shows that is the same for every user -- the
+movie's fields, its category, its owner and the first page of comments -- is
+built with two queries and cached per movie under the movie version.  The
+signal handlers bump that version whenever the movie, one of its comments or
+favorites, or its category changes, so a hot detail page is one cache read.
+"""
+from django.core.cache import cache
+from django.db.models import F
+
+from . import caching
+from .models import Comment, Movie, Profile
+from .pagination import KeysetPage, KeysetPaginator
+
+DETAIL_TIMEOUT = 60 * 60
+COMMENTS_PER_PAGE = 20
+
+MOVIE_FIELDS = (
+    'id', 'title', 'slug', 'poster', 'description', 'release_date', 'actors', 'rating', 'trailer_url',
+    'created_by_id', 'created_at', 'updated_at', 'comment_count', 'favorite_count', 'poster_status',
+    'poster_variants', 'poster_width', 'poster_height', 'poster_lqip',
+)
+
+_poster_storage = Movie._meta.get_field('poster').storage
+
+
+def comment_page(movie_id, cursor=None):
+    """One keyset page of a movie's comments, newest first, authors joined in."""
+    comments = (
+        Comment.objects.filter(movie_id=movie_id)
+        .select_related('user__profile')
+        .only('content', 'created_at', 'user__username', 'user__profile__avatar_variants')
+    )
+    return KeysetPaginator(comments, COMMENTS_PER_PAGE, ('-created_at', '-id')).page(cursor)
+
+
+def _avatar_variants(user):
+    try:
+        return user.profile.avatar_variants
+    except Profile.DoesNotExist:
+        return {}
+
+
+def _comment_payload(comment):
+    # Same attribute paths as a Comment, so _comments.html renders either.
+    return {
+        'pk': comment.pk,
+        'user_id': comment.user_id,
+        'user': {
+            'username': comment.user.username,
+            'profile': {'avatar_variants': _avatar_variants(comment.user)},
+        },
+        'content': comment.content,
+        'created_at': comment.created_at,
+    }
+
+
+def movie_detail(slug):
+    """
+    ``{'movie': {...}, 'comments': [...], 'next_cursor': ...}`` for the movie
+    with ``slug``, or None if there is none.
+    """
+    version = caching.movie_version(slug, create=False)
+    payload = None if version is None else cache.get('detail:%s:%s' % (slug, version))
+    if payload is None:
+        movie = (
+            Movie.objects.filter(slug=slug)
+            .values(*MOVIE_FIELDS, category_name=F('category__name'), category_slug=F('category__slug'))
+            .first()
+        )
+        if movie is None:
+            return None
+        if version is None:
+            version = caching.movie_version(slug)
+        movie['poster_url'] = _poster_storage.url(movie['poster']) if movie['poster'] else ''
+        comments = comment_page(movie['id'])
+        payload = {
+            'movie': movie,
+            'comments': [_comment_payload(comment) for comment in comments],
+            'next_cursor': comments.next_cursor,
+        }
+        cache.set('detail:%s:%s' % (slug, version), payload, DETAIL_TIMEOUT)
+    return payload
+
+
+def first_comment_page(payload):
+    return KeysetPage(payload['comments'], next_cursor=payload['next_cursor'])
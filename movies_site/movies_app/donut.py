@@ -0,0 +1,86 @@
+"""
+Donut caching: the shared body of a page is rendered once and cached for all
+users, and only its small per-user regions ("holes") are rendered per request.
+
+A hole is declared in a template with ``{% donut_hole "template" key=value %}``.
+Normally it renders inline.  While a view renders its cacheable skeleton the
+tag emits a signed marker instead, and ``fill_holes()`` later swaps each
+marker for the hole template rendered with the current request.
+"""
+import re
+
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import RequestContext
+from django.template.loader import get_template
+from django.template.response import TemplateResponse
+
+from . import caching
+
+HOLE_SALT = 'movies_app.donut.hole'
+HOLE_RE = re.compile(r'<!--donut-hole:([\w.:\-]+)-->')
+
+SKELETON_TIMEOUT = 60 * 10
+
+
+def hole_marker(template_name, kwargs):
+    token = signing.dumps([template_name, kwargs], salt=HOLE_SALT, compress=True)
+    return '<!--donut-hole:%s-->' % token
+
+
+def render_hole(template_name, context, kwargs):
+    template = get_template(template_name).template
+    with context.push(**kwargs):
+        return template.render(context)
+
+
+def fill_holes(skeleton, request, extra_context=None):
+    context = RequestContext(request, extra_context or {})
+
+    def replace(match):
+        template_name, kwargs = signing.loads(match.group(1), salt=HOLE_SALT)
+        return render_hole(template_name, context, kwargs)
+
+    return HOLE_RE.sub(replace, skeleton)
+
+
+class DonutCacheMixin:
+    """
+    Serve a view from a cached skeleton plus per-request holes.
+
+    Skeletons are keyed on the full path and the catalogue version;
+    ``get_skeleton_version()`` can add more (e.g. a per-movie version), or
+    return None to render this request without the skeleton cache.
+    ``get_hole_context()`` supplies the per-user data the holes need.
+    """
+    skeleton_timeout = SKELETON_TIMEOUT
+
+    def get_skeleton_version(self):
+        return ''
+
+    def get_skeleton_key(self):
+        version = self.get_skeleton_version()
+        if version is None:
+            return None
+        return caching.skeleton_key(self.request.get_full_path(), version)
+
+    def get_hole_context(self):
+        return {}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['donut_skeleton'] = True
+        return context
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_skeleton_key()
+        skeleton = None if key is None else cache.get(key)
+        if skeleton is None:
+            response = super().get(request, *args, **kwargs)
+            if not isinstance(response, TemplateResponse):
+                return response
+            skeleton = response.render().content.decode(response.charset)
+            if response.status_code == 200 and key is not None:
+                cache.set(key, skeleton, self.skeleton_timeout)
+        return HttpResponse(fill_holes(skeleton, request, self.get_hole_context()))
@@ -0,0 +1,84 @@
+"""
+Facet counts and facet filters for search results.
+
+All three facets (category, release decade and rating bucket) are counted
+with a single GROUP BY over the current result set and rolled up in Python.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import Count, IntegerField
+from django.db.models.functions import Cast, ExtractYear, Floor
+
+
+def apply_facet_filters(queryset, params):
+    """Narrow ``queryset`` by the facets selected in ``params`` (a QueryDict)."""
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category__slug=category)
+    decade = _int_param(params, 'decade')
+    if decade is not None and decade % 10 == 0 and 0 <= decade <= datetime.MAXYEAR:
+        # The first decade starts at year 1 and the last one has no end date.
+        queryset = queryset.filter(release_date__gte=datetime.date(max(decade, datetime.MINYEAR), 1, 1))
+        if decade + 10 <= datetime.MAXYEAR:
+            queryset = queryset.filter(release_date__lt=datetime.date(decade + 10, 1, 1))
+    rating = _int_param(params, 'rating')
+    if rating is not None:
+        # Buckets are [n, n + 1); the top bucket holds only 10.0.
+        queryset = queryset.filter(rating__gte=Decimal(rating), rating__lt=Decimal(rating) + 1)
+    return queryset
+
+
+def _int_param(params, name):
+    try:
+        value = int(params.get(name, ''))
+    except ValueError:
+        return None
+    return value
+
+
+def facet_counts(queryset, params):
+    """Count hits per facet value; each option carries the URL that toggles it."""
+    rows = (
+        queryset.order_by()
+        .values(
+            'category__slug',
+            'category__name',
+            decade=Floor(ExtractYear('release_date') / 10) * 10,
+            rating_bucket=Cast(Floor('rating'), IntegerField()),
+        )
+        .annotate(hits=Count('pk', distinct=True))
+    )
+    categories, decades, ratings = {}, {}, {}
+    for row in rows:
+        if row['category__slug']:
+            key = (row['category__name'], row['category__slug'])
+            categories[key] = categories.get(key, 0) + row['hits']
+        decade = int(row['decade'])
+        decades[decade] = decades.get(decade, 0) + row['hits']
+        ratings[row['rating_bucket']] = ratings.get(row['rating_bucket'], 0) + row['hits']
+
+    def option(name, value, label, hits):
+        query = params.copy()
+        query.pop('page', None)
+        selected = params.get(name) == str(value)
+        if selected:
+            query.pop(name, None)
+        else:
+            query[name] = value
+        return {'label': label, 'count': hits, 'selected': selected, 'url': '?' + query.urlencode()}
+
+    return {
+        'category': [
+            option('category', slug, name, hits)
+            for (name, slug), hits in sorted(categories.items())
+        ],
+        'decade': [
+            option('decade', decade, f'{decade}s', hits)
+            for decade, hits in sorted(decades.items(), reverse=True)
+        ],
+        'rating': [
+            option('rating', bucket, f'{bucket}.0 - {bucket}.9' if bucket < 10 else '10.0', hits)
+            for bucket, hits in sorted(ratings.items(), reverse=True)
+        ],
+    }
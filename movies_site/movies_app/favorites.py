@@ -0,0 +1,27 @@
+"""
+Per-user sets of favorited movie ids.
+
+Grids mark favorited cards and the detail page picks its favorite button from
+one cached set per user, so favorite state costs a cache lookup per request
+instead of a query per movie.  The set is loaded with a single query on a miss
+and keyed on the user's favorites version, which the Favorite signal handlers
+bump; a load racing a toggle therefore lands under a version nobody reads.
+"""
+from django.core.cache import cache
+
+from . import caching
+from .models import Favorite
+
+FAVORITES_TIMEOUT = 60 * 60 * 24
+
+
+def favorite_ids(user):
+    """Frozenset of the ids of the movies ``user`` has favorited."""
+    if not user.is_authenticated:
+        return frozenset()
+    key = 'favorites:%s:%s' % (user.pk, caching.favorites_version(user.pk))
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Favorite.objects.filter(user=user).values_list('movie_id', flat=True))
+        cache.set(key, ids, FAVORITES_TIMEOUT)
+    return ids
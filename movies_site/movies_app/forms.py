@@ -1,8 +1,41 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.core.exceptions import ValidationError
+from . import imaging
 from .models import Movie, Comment, Profile, Category, Favorite
 
+
+class SandboxedImageField(forms.ImageField):
+    """An ImageField that decodes the upload in the imaging sandbox instead of this process."""
+    default_error_messages = {
+        'image_too_large': 'This image is too large to process. Upload a smaller one.',
+    }
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+        if f.size > imaging.MAX_FILE_BYTES:
+            raise ValidationError(self.error_messages['image_too_large'], code='image_too_large')
+        if hasattr(data, 'temporary_file_path'):
+            # Large uploads are already on disk: the sandbox opens them there.
+            source = data.temporary_file_path()
+        else:
+            data.seek(0)
+            source = data.read()
+        try:
+            info = imaging.run(imaging.inspect, source)
+        except imaging.ImageTooLarge as exc:
+            raise ValidationError(self.error_messages['image_too_large'], code='image_too_large') from exc
+        except imaging.ImageRejected as exc:
+            raise ValidationError(self.error_messages['invalid_image'], code='invalid_image') from exc
+        f.content_type = info['content_type']
+        if hasattr(f, 'seek') and callable(f.seek):
+            f.seek(0)
+        return f
+
+
 class UserRegisterForm(UserCreationForm):
     email = forms.EmailField(required=True)
     first_name = forms.CharField(max_length=30, required=True)
@@ -16,6 +49,7 @@ class MovieForm(forms.ModelForm):
     class Meta:
         model = Movie
         fields = ['title', 'poster', 'description', 'release_date', 'actors', 'rating', 'category', 'trailer_url']
+        field_classes = {'poster': SandboxedImageField}
         widgets = {
             'release_date': forms.DateInput(attrs={'type': 'date'}),
         }
@@ -32,6 +66,7 @@ class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
         fields = ['bio', 'avatar']
+        field_classes = {'avatar': SandboxedImageField}
 
 class CategoryForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,126 @@
+"""
+Typo-tolerant matching of movie titles and actor names.
+
+Each distinct title and actor name is stored once as a SearchTerm, together
+with its trigrams in SearchTrigram (a side table with an index on ``gram``).
+Finding candidates for a query only reads the posting lists of the query's own
+trigrams, and within each list only the terms whose trigram count is close
+enough to the query's to reach the similarity threshold at all (the index is
+on gram, then count).  So the cost grows with how common those trigrams are
+among terms of about the query's length, not with the number of movies.
+Similarity is the same Jaccard measure pg_trgm uses.
+
+Terms are truncated to the length of ``SearchTerm.normalized``, so a very
+long title or actor name still saves.
+"""
+import math
+import re
+
+from django.db.models import Count
+
+from .models import Movie, SearchTerm, SearchTrigram
+from .typeahead import split_actors
+
+SIMILARITY_THRESHOLD = 0.3
+CANDIDATE_LIMIT = 50
+
+WORD_RE = re.compile(r'\w+')
+
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('normalized').max_length
+MAX_TEXT_LENGTH = SearchTerm._meta.get_field('text').max_length
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def trigrams(text):
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = '  %s ' % word
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similar_terms(query, limit=5, threshold=SIMILARITY_THRESHOLD):
+    """Return ``[(term, similarity), ...]`` for the terms closest to ``query``."""
+    grams = trigrams(query)
+    if not grams:
+        return []
+    # A term of m trigrams sharing c with the query's n scores c / (n + m - c),
+    # which is at most min(n, m) / max(n, m): only terms in this length band
+    # can reach the threshold, and only by sharing at least min_shared.
+    n = len(grams)
+    shortest, longest = _ceil(n * threshold), _floor(n / threshold)
+    min_shared = _ceil(threshold * (n + shortest) / (1 + threshold))
+    candidates = (
+        SearchTrigram.objects.filter(gram__in=grams, term_gram_count__range=(shortest, longest))
+        .values('term')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=min_shared)
+        .order_by('-shared')[:CANDIDATE_LIMIT]
+    )
+    shared = {row['term']: row['shared'] for row in candidates}
+    matches = []
+    for term in SearchTerm.objects.filter(pk__in=shared):
+        common = shared[term.pk]
+        similarity = common / (len(grams) + term.gram_count - common)
+        if similarity >= threshold:
+            matches.append((term, similarity))
+    matches.sort(key=lambda match: (-match[1], match[0].text))
+    return matches[:limit]
+
+
+def _ceil(value):
+    # Tolerate float error: 10 * 0.3 must give 3, not 4.
+    return math.ceil(value - 1e-9)
+
+
+def _floor(value):
+    return math.floor(value + 1e-9)
+
+
+def movies_for_terms(terms):
+    return Movie.objects.filter(search_terms__in=terms).distinct()
+
+
+# ----------------------
+# Index maintenance, called from signals.py
+# ----------------------
+def movie_term_texts(movie):
+    return [movie.title] + split_actors(movie.actors)
+
+
+def get_or_create_term(text):
+    normalized = normalize(text)[:MAX_TERM_LENGTH].rstrip()
+    if not normalized:
+        return None
+    grams = trigrams(normalized)
+    term, created = SearchTerm.objects.get_or_create(
+        normalized=normalized,
+        defaults={'text': text[:MAX_TEXT_LENGTH], 'gram_count': len(grams)},
+    )
+    if created:
+        SearchTrigram.objects.bulk_create(
+            SearchTrigram(term=term, gram=gram, term_gram_count=term.gram_count) for gram in grams)
+    return term
+
+
+def index_movie(movie):
+    old_term_ids = list(movie.search_terms.values_list('pk', flat=True))
+    terms = [get_or_create_term(text) for text in movie_term_texts(movie)]
+    movie.search_terms.set([term for term in terms if term is not None])
+    delete_orphan_terms(old_term_ids)
+
+
+def delete_orphan_terms(term_ids):
+    SearchTerm.objects.filter(pk__in=term_ids, movies=None).delete()
+
+
+def rebuild_index():
+    SearchTerm.objects.all().delete()
+    count = 0
+    for movie in Movie.objects.only('pk', 'title', 'actors').iterator():
+        index_movie(movie)
+        count += 1
+    return count
@@ -0,0 +1,57 @@
+"""
+A small database-backed queue for image work.
+
+Uploads queue an ``ImageTask`` and return; ``manage.py process_image_tasks``
+claims tasks one at a time and runs the handler for their kind.  Claiming is
+a compare-and-set UPDATE on the task's status, so any number of workers can
+run side by side on any database backend.  A task whose worker died is
+claimed again once it has been running for longer than ``TASK_TIMEOUT``.
+"""
+import datetime
+import traceback
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import avatars, posters
+from .models import ImageTask
+
+MAX_ATTEMPTS = 3
+TASK_TIMEOUT = datetime.timedelta(minutes=10)
+
+# kind -> (process, give_up); give_up runs once a task has used all its attempts.
+HANDLERS = {
+    ImageTask.POSTER: (posters.process_task, posters.fail_task),
+    ImageTask.AVATAR: (avatars.process_task, avatars.fail_task),
+}
+
+
+def claim_next():
+    """Take the oldest runnable task for this worker, or return None."""
+    runnable = ImageTask.objects.filter(
+        Q(status=ImageTask.PENDING)
+        | Q(status=ImageTask.RUNNING, started_at__lt=timezone.now() - TASK_TIMEOUT)
+    )
+    for task in runnable.order_by('created_at')[:10]:
+        claimed = ImageTask.objects.filter(pk=task.pk, status=task.status, started_at=task.started_at).update(
+            status=ImageTask.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1)
+        if claimed:
+            task.refresh_from_db()
+            return task
+    return None
+
+
+def run_task(task):
+    """Run a claimed task; returns True on success."""
+    process, give_up = HANDLERS[task.kind]
+    try:
+        process(task)
+    except Exception:
+        task.error = traceback.format_exc()
+        task.status = ImageTask.FAILED if task.attempts >= MAX_ATTEMPTS else ImageTask.PENDING
+        task.save(update_fields=['status', 'error'])
+        if task.status == ImageTask.FAILED:
+            give_up(task)
+        return False
+    task.delete()
+    return True
@@ -0,0 +1,210 @@
+"""
+Image decoding in resource-limited child processes.
+
+Every Pillow decode of an upload goes through ``run()``: the form fields
+validate uploads with ``inspect()`` and the image worker builds poster and
+avatar variants with ``poster_variants()`` / ``avatar_variants()``.  They are
+given the image as a file path, which the child opens itself, or as bytes
+when the file isn't on local disk.  Each call runs in a fresh child forked
+from a forkserver that has already imported this module and Pillow, so
+starting one costs a fork, not an interpreter (where there is no forkserver,
+as on Windows, each child is spawned instead).  The limits:
+
+* ``MAX_FILE_BYTES`` -- larger files are refused before a child is started;
+* ``MAX_IMAGE_PIXELS`` -- larger images are refused before their pixels are
+  decoded (decompression bombs);
+* ``CPU_SECONDS`` and ``MEMORY_BYTES`` -- enforced by the kernel with
+  ``RLIMIT_CPU`` / ``RLIMIT_AS``, which kill the child, on platforms that
+  support them;
+* ``TIMEOUT`` -- wall-clock time after which the parent kills the child.
+
+A child that breaks a limit only takes its own call down: the caller gets
+``ImageTooLarge`` (or ``ImageRejected`` for data Pillow can't read), and the
+web or image worker process carries on.  At most ``WORKERS`` children run at
+once per process.
+
+This module must not import Django: the forkserver imports it without
+settings.  As with any forkserver or spawn, children re-import ``__main__``,
+so the entry point must keep its work under ``if __name__ == '__main__'``
+(as manage.py and WSGI servers do).
+"""
+import base64
+import io
+import multiprocessing
+import os
+import threading
+import warnings
+
+from PIL import Image, ImageFilter, ImageOps
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MAX_FILE_BYTES = 30 * 1024 ** 2
+MAX_IMAGE_PIXELS = 50_000_000
+CPU_SECONDS = 20
+MEMORY_BYTES = 2 * 1024 ** 3
+TIMEOUT = 30
+WORKERS = 2
+
+
+class ImageRejected(Exception):
+    """The data is not an image Pillow can decode."""
+
+
+class ImageTooLarge(ImageRejected):
+    """Decoding the image would take more pixels, memory or time than allowed."""
+
+
+def _get_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+_context = _get_context()
+_slots = threading.BoundedSemaphore(WORKERS)
+
+
+def _limit_resources():
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    # Pillow only warns between MAX_IMAGE_PIXELS and twice that.
+    warnings.simplefilter('error', Image.DecompressionBombWarning)
+    if resource is None:
+        return
+    for name, limits in (('RLIMIT_CPU', (CPU_SECONDS, CPU_SECONDS + 1)), ('RLIMIT_AS', (MEMORY_BYTES, MEMORY_BYTES))):
+        try:
+            resource.setrlimit(getattr(resource, name), limits)
+        except (AttributeError, ValueError, OSError):
+            # Not supported here (macOS refuses RLIMIT_AS) or above the hard
+            # limit: the pixel limit and the parent's timeout still apply.
+            pass
+
+
+def _child(conn, func, args):
+    try:
+        _limit_resources()
+        result = ('ok', func(*args))
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning, MemoryError) as exc:
+        result = ('too_large', str(exc))
+    except Exception as exc:
+        result = ('invalid', f'{type(exc).__name__}: {exc}')
+    conn.send(result)
+    conn.close()
+
+
+def stored_source(storage, name):
+    """The source to hand ``run()`` for a stored file: its path on local disk, or else its bytes."""
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        with storage.open(name) as f:
+            return f.read()
+
+
+def run(func, source, *args, timeout=TIMEOUT):
+    """
+    Call ``func(source, *args)`` (a function of this module) in a limited
+    child and return its result.  ``source`` is a file path or bytes.
+    """
+    size = os.path.getsize(source) if isinstance(source, str) else len(source)
+    if size > MAX_FILE_BYTES:
+        raise ImageTooLarge(f'The file is larger than {MAX_FILE_BYTES} bytes.')
+    with _slots:
+        receiver, sender = _context.Pipe(duplex=False)
+        process = _context.Process(target=_child, args=(sender, func, (source, *args)), daemon=True)
+        process.start()
+        sender.close()
+        try:
+            if not receiver.poll(timeout):
+                raise ImageTooLarge(f'Decoding took longer than {timeout} seconds.')
+            status, value = receiver.recv()
+        except EOFError:
+            # The kernel killed the child for going over its CPU or memory limit.
+            raise ImageTooLarge('Decoding went over its CPU or memory limit.') from None
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+    if status == 'too_large':
+        raise ImageTooLarge(value)
+    if status == 'invalid':
+        raise ImageRejected(value)
+    return value
+
+
+# ----------------------
+# Run in the child
+# ----------------------
+def _open(source):
+    return Image.open(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def _decode(source):
+    image = _open(source)
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image
+
+
+def inspect(source):
+    """Fully decode ``source``; return its format, MIME type and size."""
+    image = _open(source)
+    fmt = image.format
+    image.load()
+    return {
+        'format': fmt,
+        'content_type': Image.MIME.get(fmt),
+        'width': image.width,
+        'height': image.height,
+    }
+
+
+def _encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+def lqip_data_uri(image, width, fmt):
+    """A few hundred bytes of blurred, tiny image to paint while the real one loads."""
+    height = max(1, round(image.height * width / image.width))
+    tiny = image.convert('RGB').resize((width, height), Image.Resampling.BOX)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    return f'data:image/{fmt};base64,{base64.b64encode(_encode(tiny, fmt, 40)).decode()}'
+
+
+def poster_variants(source, widths, formats, quality, lqip_width):
+    """
+    Encode the poster at each of ``widths`` (never upscaled) in each format.
+    Returns the intrinsic size, ``{fmt: [(width, bytes), ...]}`` and the
+    placeholder data URI.
+    """
+    image = _decode(source)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    encoded = {}
+    for fmt in formats:
+        encoded[fmt] = []
+        for width in sorted({min(width, image.width) for width in widths}):
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+            encoded[fmt].append((width, _encode(resized, fmt, quality[fmt])))
+    lqip = lqip_data_uri(image, lqip_width, 'webp' if 'webp' in formats else 'jpeg')
+    return {'width': image.width, 'height': image.height, 'variants': encoded, 'lqip': lqip}
+
+
+def avatar_variants(source, sizes, fmt, quality):
+    """Center-crop to a square and encode it at each of ``sizes`` (never upscaled): ``[(size, bytes), ...]``."""
+    image = _decode(source)
+    image = image.convert('RGBA' if fmt == 'webp' and image.has_transparency_data else 'RGB')
+    side = min(image.width, image.height)
+    return [
+        (size, _encode(ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS), fmt, quality))
+        for size in sorted({min(size, side) for size in sizes})
+    ]
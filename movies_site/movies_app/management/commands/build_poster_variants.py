@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from movies_app import imaging, posters
+from movies_app.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/AVIF poster variants for movies that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=imaging.WORKERS, help='Number of posters built at once.')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that are already up to date.')
+
+    def handle(self, *args, **options):
+        pending = [
+            (pk, poster)
+            for pk, poster, variants, lqip in Movie.objects.exclude(poster='').values_list(
+                'pk', 'poster', 'poster_variants', 'poster_lqip')
+            if options['force'] or posters.needs_variants(poster, variants, lqip)
+        ]
+        # Decoding and encoding happen in imaging sandbox processes; the threads
+        # only wait on them and write files.  Results are written back to the
+        # database from this thread.
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(posters.build_variants, poster): (pk, poster) for pk, poster in pending}
+            for future in as_completed(futures):
+                pk, poster = futures[future]
+                try:
+                    fields = future.result()
+                except (OSError, imaging.ImageRejected) as exc:
+                    failed += 1
+                    self.stderr.write(f'{poster}: {exc}')
+                    continue
+                posters.apply_variants(pk, poster, fields)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(f'Built poster variants for {built} movies ({failed} failed).'))
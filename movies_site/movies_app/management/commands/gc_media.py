@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from movies_app import media
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media files that no movie, profile or queued task refers to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the files without deleting them.')
+        parser.add_argument(
+            '--grace-hours', type=float, default=media.GC_GRACE_PERIOD.total_seconds() / 3600,
+            help='Keep files modified more recently than this.')
+
+    def handle(self, *args, **options):
+        removed = media.collect_garbage(
+            dry_run=options['dry_run'], grace_period=datetime.timedelta(hours=options['grace_hours']))
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(removed)} unreferenced files.'))
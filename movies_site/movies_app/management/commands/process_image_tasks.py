@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies_app import image_tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued image tasks (poster variants), polling for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        while True:
+            task = image_tasks.claim_next()
+            if task is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            if image_tasks.run_task(task):
+                self.stdout.write(f'Processed {task.kind} task for {task.source}.')
+            else:
+                self.stderr.write(f'{task.kind} task for {task.source} failed (attempt {task.attempts}).')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from movies_app import fuzzy, search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text and trigram search indexes from the Movie table.'
+
+    def handle(self, *args, **options):
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} movies for full-text search.'))
+        count = fuzzy.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} movies for fuzzy search.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movies_app import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the denormalized comment and favorite counters on Movie.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=counters.RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = counters.reconcile(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Repaired counters on {count} movies.'))
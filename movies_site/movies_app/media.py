@@ -0,0 +1,220 @@
+"""
+Serving and garbage-collecting uploaded media.
+
+Content-addressed files (see ``storage.py``) never change under their name,
+so they are served as immutable for a year; anything else gets a short
+max-age.  ``collect_garbage()`` deletes content-addressed files that no row
+refers to any more.
+
+``serve_file()`` answers conditional requests itself and leaves the bytes
+to the cheapest sender available (``assets.py`` uses it for static files).  With ``MEDIA_SENDFILE`` set it only
+returns headers and the front server delivers the file (and any Range):
+
+* ``'x-accel-redirect'`` -- nginx, with an ``internal`` location mapping
+  ``MEDIA_ACCEL_PREFIX`` onto ``MEDIA_ROOT``;
+* ``'x-sendfile'`` -- Apache mod_xsendfile or lighttpd.
+
+Otherwise it returns a ``FileResponse``, which WSGI servers such as gunicorn
+send with ``os.sendfile``; single byte ranges are answered with a 206.
+"""
+import datetime
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from . import avatars, posters
+from .models import ImageTask, Movie, Profile
+from .storage import HASHED_NAME_RE, is_hashed_name
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MUTABLE_MAX_AGE = 60 * 60
+
+# Files younger than this are kept even if unreferenced: their row may not
+# be committed yet.  Saving an upload that deduplicates onto an existing file
+# refreshes its mtime, so that counts as young too.
+GC_GRACE_PERIOD = datetime.timedelta(days=1)
+GC_BATCH_SIZE = 2000
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_etag(path, stat):
+    match = HASHED_NAME_RE.search(path)
+    if match:
+        # The name is the content hash, so it is a strong validator as is.
+        return match.group(1)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def byte_range(request, size, etag, last_modified):
+    """The (start, end) of a single satisfiable Range, None for the whole file, or False if unsatisfiable."""
+    header = request.headers.get('Range')
+    if not header or size == 0:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != quote_etag(etag) and parse_http_date_safe(if_range) != last_modified:
+        # The client's partial copy is stale: send the whole file.
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Multiple ranges and other units are optional; ignore them.
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        # An invalid range-spec, which must be ignored rather than refused.
+        return None
+    if first == '':
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+class RangeFile:
+    """Read only ``length`` bytes of ``file`` from ``start``; no ``fileno``, so it is never sent whole."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def sendfile_response(accel_prefix, path, fullpath):
+    """Headers-only response asking the front server to send the file, or None to send it ourselves."""
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = quote(accel_prefix.rstrip('/') + '/' + path)
+        return response
+    if settings.MEDIA_SENDFILE == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = fullpath
+        return response
+    return None
+
+
+def serve_file(request, document_root, path, accel_prefix, max_age, immutable=False):
+    """
+    Answer a request for ``path`` under ``document_root``: validators and
+    304s here, the bytes from the front server or a (ranged) FileResponse.
+    """
+    try:
+        fullpath = safe_join(document_root, posixpath.normpath(path).lstrip('/'))
+        stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('File not found.')
+    if not os.path.isfile(fullpath):
+        raise Http404('File not found.')
+
+    etag = media_etag(path, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is None:
+        response = sendfile_response(accel_prefix, path, fullpath)
+    if response is None:
+        span = byte_range(request, stat.st_size, etag, last_modified)
+        if span is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif span is None:
+            response = FileResponse(open(fullpath, 'rb'))
+        else:
+            start, end = span
+            response = FileResponse(RangeFile(open(fullpath, 'rb'), start, end - start + 1), status=206)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    if response.status_code not in (200, 206, 304):
+        # 412 and 416 carry no representation to describe or cache.
+        return response
+    if response.status_code != 304:
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(last_modified)
+    if immutable:
+        patch_cache_control(response, public=True, max_age=max_age, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    hashed = is_hashed_name(path)
+    max_age = IMMUTABLE_MAX_AGE if hashed else MUTABLE_MAX_AGE
+    return serve_file(request, settings.MEDIA_ROOT, path, settings.MEDIA_ACCEL_PREFIX, max_age, immutable=hashed)
+
+
+def referenced_names(batch_size=GC_BATCH_SIZE):
+    """Every media name a row points at: posters, avatars, their variants and queued sources."""
+    names = set(Movie.objects.exclude(poster='').values_list('poster', flat=True).iterator(batch_size))
+    for variants in Movie.objects.values_list('poster_variants', flat=True).iterator(batch_size):
+        names.update(posters.variant_paths(variants))
+    names.update(
+        Profile.objects.exclude(avatar='').exclude(avatar=None).values_list('avatar', flat=True).iterator(batch_size))
+    for variants in Profile.objects.values_list('avatar_variants', flat=True).iterator(batch_size):
+        names.update(avatars.variant_paths(variants))
+    names.update(ImageTask.objects.values_list('source', flat=True).iterator(batch_size))
+    return names
+
+
+def hashed_files(storage, directory=''):
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        name = f'{directory}/{filename}' if directory else filename
+        if is_hashed_name(name):
+            yield name
+    for subdirectory in directories:
+        yield from hashed_files(storage, f'{directory}/{subdirectory}' if directory else subdirectory)
+
+
+def collect_garbage(dry_run=False, grace_period=GC_GRACE_PERIOD, storage=default_storage):
+    """Delete unreferenced content-addressed files; returns the names removed (or that would be)."""
+    cutoff = timezone.now() - grace_period
+    referenced = referenced_names()
+    candidates = [
+        name for name in hashed_files(storage)
+        if name not in referenced and storage.get_modified_time(name) <= cutoff
+    ]
+    if not candidates:
+        return []
+    # The walk can take a while: references added meanwhile are caught by
+    # a second look at the rows, and uploads deduplicated onto a candidate
+    # by its refreshed mtime, checked again right before each delete.
+    referenced = referenced_names()
+    removed = []
+    for name in candidates:
+        if name in referenced or storage.get_modified_time(name) > cutoff:
+            continue
+        if not dry_run:
+            storage.delete(name)
+        removed.append(name)
+    return removed
@@ -0,0 +1,36 @@
+"""
+Process-independent counters kept in the default cache.
+
+``incr()`` is cheap enough to call on hot paths; ``snapshot()`` feeds the
+staff-only metrics endpoint.
+"""
+from django.core.cache import cache
+
+PREFIX = 'metrics:'
+
+COUNTERS = (
+    'card_cache.hits',
+    'card_cache.misses',
+    'card_cache.render_us',
+)
+
+
+def incr(name, amount=1):
+    if not amount:
+        return
+    key = PREFIX + name
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+def snapshot():
+    values = cache.get_many([PREFIX + name for name in COUNTERS])
+    counters = {name: values.get(PREFIX + name, 0) for name in COUNTERS}
+    hits, misses = counters['card_cache.hits'], counters['card_cache.misses']
+    average_render_us = counters['card_cache.render_us'] / misses if misses else 0
+    counters['card_cache.hit_rate'] = hits / (hits + misses) if hits + misses else 0
+    counters['card_cache.render_us_saved'] = round(hits * average_render_us)
+    return counters
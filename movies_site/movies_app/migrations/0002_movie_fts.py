@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE movies_app_movie_fts USING fts5("
+        "title, actors, category, description, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO movies_app_movie_fts (rowid, title, actors, category, description) "
+        "SELECT m.id, m.title, m.actors, COALESCE(c.name, ''), m.description "
+        "FROM movies_app_movie m LEFT JOIN movies_app_category c ON c.id = m.category_id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS movies_app_movie_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:47
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+WORD_RE = re.compile(r'\w+')
+
+
+def trigrams(text):
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = '  %s ' % word
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def index_existing_movies(apps, schema_editor):
+    Movie = apps.get_model('movies_app', 'Movie')
+    SearchTerm = apps.get_model('movies_app', 'SearchTerm')
+    SearchTrigram = apps.get_model('movies_app', 'SearchTrigram')
+    # Same truncation as fuzzy.get_or_create_term(), so long names fit the columns.
+    max_normalized = SearchTerm._meta.get_field('normalized').max_length
+    max_text = SearchTerm._meta.get_field('text').max_length
+    terms = {}
+    for movie in Movie.objects.only('pk', 'title', 'actors').iterator():
+        texts = [movie.title] + [name.strip() for name in movie.actors.split(',')]
+        for text in texts:
+            normalized = ' '.join(WORD_RE.findall(text.lower()))[:max_normalized].rstrip()
+            if not normalized:
+                continue
+            if normalized not in terms:
+                grams = trigrams(normalized)
+                term = SearchTerm.objects.create(text=text[:max_text], normalized=normalized, gram_count=len(grams))
+                SearchTrigram.objects.bulk_create(SearchTrigram(term=term, gram=gram) for gram in grams)
+                terms[normalized] = term
+            terms[normalized].movies.add(movie)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0002_movie_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=255)),
+                ('normalized', models.CharField(max_length=255, unique=True)),
+                ('gram_count', models.PositiveSmallIntegerField()),
+                ('movies', models.ManyToManyField(related_name='search_terms', to='movies_app.movie')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='movies_app.searchterm')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gram', 'term'], name='movies_app__gram_5445c0_idx')],
+                'unique_together': {('term', 'gram')},
+            },
+        ),
+        migrations.RunPython(index_existing_movies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0004_movie_facet_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-created_at', '-id'], name='movies_app__created_8442ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='movies_app__categor_946600_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='movies_app__created_d65fff_idx'),
+        ),
+    ]
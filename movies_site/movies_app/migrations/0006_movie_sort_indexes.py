@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0005_movie_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movie',
+            name='movies_app__release_c32170_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='movie',
+            name='movies_app__rating_d26ab3_idx',
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-rating', '-id'], name='movies_app__rating_48ea01_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-release_date', '-id'], name='movies_app__release_8a9d8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'id'], name='movies_app__title_9ed764_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', '-rating', '-id'], name='movies_app__categor_733929_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', '-release_date', '-id'], name='movies_app__categor_916616_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', 'title', 'id'], name='movies_app__categor_7b06b2_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0006_movie_sort_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['movie', '-created_at', '-id'], name='movies_app__movie_i_07d3af_idx'),
+        ),
+    ]
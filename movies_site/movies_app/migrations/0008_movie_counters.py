@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-16 12:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    Movie = apps.get_model('movies_app', 'Movie')
+
+    def counted(model_name):
+        rows = (
+            apps.get_model('movies_app', model_name).objects.filter(movie=OuterRef('pk'))
+            .order_by().values('movie').annotate(n=Count('pk'))
+        )
+        return Coalesce(Subquery(rows.values('n')), 0)
+
+    Movie.objects.update(comment_count=counted('Comment'), favorite_count=counted('Favorite'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0007_comment_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-comment_count', '-id'], name='movies_app__comment_06420d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-favorite_count', '-id'], name='movies_app__favorit_321c05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', '-comment_count', '-id'], name='movies_app__categor_57015d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', '-favorite_count', '-id'], name='movies_app__categor_b00c02_idx'),
+        ),
+    ]
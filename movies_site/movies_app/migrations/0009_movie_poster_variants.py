@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0008_movie_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='poster_height',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='poster_variants',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='poster_width',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0010_image_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='poster_lqip',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
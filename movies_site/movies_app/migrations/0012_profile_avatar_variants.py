@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 13:12
+
+from django.db import migrations, models
+
+
+def queue_existing_avatars(apps, schema_editor):
+    # The image worker builds variants for avatars uploaded before they existed.
+    Profile = apps.get_model('movies_app', 'Profile')
+    ImageTask = apps.get_model('movies_app', 'ImageTask')
+    ImageTask.objects.bulk_create(
+        ImageTask(kind='avatar', object_id=pk, source=avatar)
+        for pk, avatar in Profile.objects.exclude(avatar='').exclude(avatar=None).values_list('pk', 'avatar')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0011_movie_poster_lqip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='imagetask',
+            name='kind',
+            field=models.CharField(choices=[('poster', 'Poster variants'), ('avatar', 'Avatar variants')], max_length=20),
+        ),
+        migrations.RunPython(queue_existing_avatars, migrations.RunPython.noop),
+    ]
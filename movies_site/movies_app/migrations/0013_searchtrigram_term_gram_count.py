@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_gram_counts(apps, schema_editor):
+    SearchTerm = apps.get_model('movies_app', 'SearchTerm')
+    SearchTrigram = apps.get_model('movies_app', 'SearchTrigram')
+    SearchTrigram.objects.update(term_gram_count=Subquery(
+        SearchTerm.objects.filter(pk=OuterRef('term_id')).values('gram_count')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0012_profile_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='searchtrigram',
+            name='movies_app__gram_5445c0_idx',
+        ),
+        migrations.AddField(
+            model_name='searchtrigram',
+            name='term_gram_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_gram_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='searchtrigram',
+            index=models.Index(fields=['gram', 'term_gram_count', 'term'], name='movies_app__gram_797cf1_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE TABLE movies_app_movie_search ("
+        "movie_id integer PRIMARY KEY REFERENCES movies_app_movie (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX movies_app_movie_search_document ON movies_app_movie_search USING gin (document)"
+    )
+    schema_editor.execute(
+        "INSERT INTO movies_app_movie_search (movie_id, document) "
+        "SELECT m.id, "
+        "setweight(to_tsvector(m.title), 'A') || "
+        "setweight(to_tsvector(m.actors), 'B') || "
+        "setweight(to_tsvector(COALESCE(c.name, '')), 'C') || "
+        "setweight(to_tsvector(m.description), 'D') "
+        "FROM movies_app_movie m LEFT JOIN movies_app_category c ON c.id = m.category_id"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS movies_app_movie_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies_app', '0013_searchtrigram_term_gram_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
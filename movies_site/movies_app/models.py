@@ -24,6 +24,8 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Square resized copies of the avatar, built by the image worker; see avatars.py.
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Profile of {self.user.username}"
@@ -33,6 +35,21 @@ class Movie(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=280, unique=True)
     poster = models.ImageField(upload_to='posters/')
+    # Filled in with the resized WebP/AVIF copies of the poster by the image
+    # worker; see posters.py.  Until then cards show a placeholder.
+    POSTER_PENDING = 'pending'
+    POSTER_READY = 'ready'
+    POSTER_FAILED = 'failed'
+    POSTER_STATUS_CHOICES = [
+        (POSTER_PENDING, 'Processing'),
+        (POSTER_READY, 'Ready'),
+        (POSTER_FAILED, 'Failed'),
+    ]
+    poster_status = models.CharField(max_length=10, choices=POSTER_STATUS_CHOICES, default=POSTER_READY, editable=False)
+    poster_width = models.PositiveIntegerField(null=True, editable=False)
+    poster_height = models.PositiveIntegerField(null=True, editable=False)
+    poster_variants = models.JSONField(default=dict, editable=False)
+    poster_lqip = models.TextField(blank=True, editable=False)
     description = models.TextField()
     release_date = models.DateField()
     actors = models.TextField(help_text='Comma-separated list of main actors')
@@ -45,14 +62,46 @@ class Movie(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='movies')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, only ever written with F() updates; see counters.py.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('comment_count', 'favorite_count')
 
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['title', 'slug'])]
+        indexes = [
+            models.Index(fields=['title', 'slug']),
+            # Keyset pagination seeks on (sort field, id), optionally within a
+            # category; see MOVIE_LIST_SORTS in views.py.
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['-rating', '-id']),
+            models.Index(fields=['-release_date', '-id']),
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['-comment_count', '-id']),
+            models.Index(fields=['-favorite_count', '-id']),
+            models.Index(fields=['category', '-created_at', '-id']),
+            models.Index(fields=['category', '-rating', '-id']),
+            models.Index(fields=['category', '-release_date', '-id']),
+            models.Index(fields=['category', 'title', 'id']),
+            models.Index(fields=['category', '-comment_count', '-id']),
+            models.Index(fields=['category', '-favorite_count', '-id']),
+            models.Index(fields=['created_by', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return self.title
 
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # A full save() of an instance loaded before a counter update would
+        # write the old counts back, so the UPDATE of an existing row leaves
+        # the counters out.  Nothing else about save() changes: update_fields
+        # given by the caller are written as given, and if the row is gone the
+        # INSERT that follows still writes every field.
+        if update_fields is None:
+            values = [value for value in values if value[0].name not in self.COUNTER_FIELDS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
     def get_absolute_url(self):
         return reverse('movie_detail', args=[self.slug])
 
@@ -69,6 +118,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a movie's comments, newest first.
+            models.Index(fields=['movie', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.movie.title}"
@@ -87,6 +140,60 @@ class Favorite(models.Model):
         return f"{self.user.username} favorited {self.movie.title}"
 
 
+class SearchTerm(models.Model):
+    """A movie title or actor name that typo-tolerant search can suggest."""
+    text = models.CharField(max_length=255)
+    normalized = models.CharField(max_length=255, unique=True)
+    gram_count = models.PositiveSmallIntegerField()
+    movies = models.ManyToManyField(Movie, related_name='search_terms')
+
+    def __str__(self):
+        return self.text
+
+
+class SearchTrigram(models.Model):
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='trigrams')
+    gram = models.CharField(max_length=3)
+    # Copy of term.gram_count, so candidates are narrowed by length inside
+    # the gram index; see fuzzy.similar_terms().
+    term_gram_count = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('term', 'gram')
+        indexes = [models.Index(fields=['gram', 'term_gram_count', 'term'])]
+
+    def __str__(self):
+        return f"{self.gram!r} in {self.term_id}"
+
+
+class ImageTask(models.Model):
+    """Image work queued by an upload, run by ``manage.py process_image_tasks``."""
+    POSTER = 'poster'
+    AVATAR = 'avatar'
+    KIND_CHOICES = [(POSTER, 'Poster variants'), (AVATAR, 'Avatar variants')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} task for {self.source} ({self.status})"
+
+
 # Signals to auto-create Profile when a User is created
 from django.db.models.signals import post_save
 from django.dispatch import receiver
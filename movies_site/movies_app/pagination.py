@@ -0,0 +1,209 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from . import caching
+
+COUNT_TIMEOUT = 60 * 60
+
+# Above this many rows an unfiltered table is counted from planner statistics.
+ESTIMATE_THRESHOLD = 100_000
+
+
+def estimated_row_count(model):
+    """Row count of ``model``'s table from database statistics, or None."""
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                # Only present once ANALYZE has run.
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+def cached_count(queryset):
+    """
+    COUNT(*) of ``queryset``, cached per filter under the catalogue version so
+    Movie and Category saves/deletes invalidate it.  Very large unfiltered
+    tables are estimated instead of counted.
+    """
+    if queryset.query.is_empty():
+        # .none() has no SQL to key on, and nothing to count.
+        return 0
+    key = caching.count_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        if not queryset.query.where and not queryset.query.extra_tables:
+            count = estimated_row_count(queryset.model)
+        if count is None or count < ESTIMATE_THRESHOLD:
+            count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """A Paginator that takes its count from ``cached_count()``."""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class PrecountedPaginator(Paginator):
+    """A Paginator whose total count is already known, e.g. from a cache."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+# ----------------------
+# Keyset (cursor) pagination
+# ----------------------
+CURSOR_SALT = 'movies_app.pagination.cursor'
+
+
+class CursorSerializer:
+    """JSON that round-trips the values of the ordering fields exactly."""
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), default=self._default).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+    @staticmethod
+    def _default(value):
+        # Full isoformat() keeps microseconds, which DjangoJSONEncoder drops.
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def keyset_ordering(ordering):
+    """Append a primary key tie-breaker so the ordering is total."""
+    ordering = list(ordering)
+    if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+        ordering.append('-id' if ordering and ordering[-1].startswith('-') else 'id')
+    return tuple(ordering)
+
+
+def keyset_filter(ordering, values, forward=True):
+    """Q for the rows strictly after ``values`` in ``ordering`` (or before, if not ``forward``)."""
+    condition = Q()
+    for i, field in reversed(list(enumerate(ordering))):
+        name = field.lstrip('-')
+        after = field.startswith('-') != forward
+        step = Q(**{f'{name}__{"gt" if after else "lt"}': values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{name: values[i]}) & condition
+        condition = step
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Seek-based paginator: every page is fetched with a WHERE on the ordering
+    columns instead of an OFFSET, so page 1000 costs the same as page 1 and
+    no COUNT(*) is needed.  Cursors are signed and bound to the ordering.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = keyset_ordering(ordering)
+
+    def encode_cursor(self, obj, forward):
+        # Rows are model instances or, for values() querysets, dicts.
+        get = obj.__getitem__ if isinstance(obj, dict) else lambda name: getattr(obj, name)
+        values = [get(field.lstrip('-')) for field in self.ordering]
+        payload = {'o': self.ordering, 'v': values, 'f': forward}
+        return signing.dumps(payload, salt=CURSOR_SALT, serializer=CursorSerializer, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT, serializer=CursorSerializer)
+        except signing.BadSignature:
+            raise Http404('Invalid cursor.')
+        if tuple(payload['o']) != self.ordering:
+            raise Http404('Cursor does not match the current ordering.')
+        return payload['v'], payload['f']
+
+    def page(self, cursor=None):
+        values, forward = self.decode_cursor(cursor) if cursor else (None, True)
+        if forward:
+            ordering = self.ordering
+        else:
+            ordering = tuple(field[1:] if field.startswith('-') else '-' + field for field in self.ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+        more_after = has_more if forward else values is not None
+        more_before = values is not None if forward else has_more
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], True) if more_after else None,
+            previous_cursor=self.encode_cursor(rows[0], False) if more_before else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that paginates by cursor using the view's ordering."""
+    cursor_kwarg = 'cursor'
+
+    def get_ordering(self):
+        return keyset_ordering(super().get_ordering() or self.model._meta.ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_ordering())
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,133 @@
+"""
+Resized, re-encoded poster variants for responsive images.
+
+An uploaded poster is decoded once and written out at each width in
+``VARIANT_WIDTHS`` (never upscaled) in each modern format Pillow can encode
+here.  ``Movie.poster_variants`` records the result::
+
+    {'source': 'posters/heat.jpg', 'avif': [[320, 'posters/variants/heat-320.avif'], ...], 'webp': [...]}
+
+``source`` is the poster the variants were built from, so a replaced poster is
+detected by comparing it with ``Movie.poster``.  Alongside them the intrinsic
+size and a tiny blurred data URI (``poster_lqip``) are stored, so cards can
+reserve the right space and paint a preview without another request.
+Templates turn the lists into ``srcset`` attributes with the
+``poster_picture`` tag.
+
+Building variants is slow for large uploads, so it never happens in a
+request: saving a new poster marks the movie pending and queues an
+``ImageTask``, and the image worker builds and applies the variants.
+"""
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.db.models.functions import Now
+from PIL import features
+
+from . import caching, imaging
+from .models import ImageTask, Movie
+
+VARIANT_WIDTHS = {
+    'card': 320,
+    'detail': 640,
+    'retina': 1280,
+}
+VARIANT_DIR = 'posters/variants'
+
+# Best first: <picture> offers the sources in this order.
+FORMATS = tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt))
+QUALITY = {'avif': 55, 'webp': 75}
+
+# Width of the inline placeholder; the browser scales it up to the layout size.
+LQIP_WIDTH = 16
+
+# How each page shows a poster: the width it is laid out at and the ``sizes``
+# hint that lets the browser pick from the srcset before layout.
+PICTURE_PRESETS = {
+    'card': {
+        'width': VARIANT_WIDTHS['card'],
+        'sizes': '(min-width: 640px) 320px, 100vw',
+        'attrs': {'loading': 'lazy', 'decoding': 'async'},
+    },
+    'detail': {
+        'width': VARIANT_WIDTHS['detail'],
+        'sizes': '(min-width: 768px) 33vw, 100vw',
+        'attrs': {'fetchpriority': 'high', 'decoding': 'async'},
+    },
+}
+
+poster_storage = Movie._meta.get_field('poster').storage
+
+
+def needs_variants(name, variants, lqip):
+    return bool(name) and ((variants or {}).get('source') != name or not lqip)
+
+
+def build_variants(name):
+    """
+    Write the variants of the poster stored as ``name`` and return the Movie
+    fields describing them.  Only touches storage, never the database; the
+    image itself is decoded and encoded in the ``imaging`` sandbox.
+    """
+    built = imaging.run(
+        imaging.poster_variants, imaging.stored_source(poster_storage, name), sorted(VARIANT_WIDTHS.values()), FORMATS, QUALITY, LQIP_WIDTH)
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    variants = {'source': name}
+    for fmt, encoded in built['variants'].items():
+        variants[fmt] = [
+            [width, poster_storage.save(f'{VARIANT_DIR}/{stem}-{width}.{fmt}', ContentFile(content))]
+            for width, content in encoded
+        ]
+    return {
+        'poster_variants': variants,
+        'poster_width': built['width'],
+        'poster_height': built['height'],
+        'poster_lqip': built['lqip'],
+    }
+
+
+def variant_paths(variants):
+    return {path for fmt in FORMATS for _width, path in (variants or {}).get(fmt, [])}
+
+
+def apply_variants(movie_id, source, fields):
+    """Store what ``build_variants(source)`` returned and invalidate everything that shows the poster."""
+    # Replaced and orphaned variant files may be shared with other movies, so
+    # they are left to ``manage.py gc_media``.
+    slug = Movie.objects.filter(pk=movie_id, poster=source).values_list('slug', flat=True).first()
+    if slug is None:
+        # The movie is gone or has a newer poster.
+        return
+    # updated_at moves so cached card fragments for the movie are re-rendered.
+    Movie.objects.filter(pk=movie_id, poster=source).update(
+        **fields, poster_status=Movie.POSTER_READY, updated_at=Now())
+    caching.bump_movie_version(slug)
+    caching.bump_catalogue_version()
+
+
+# ----------------------
+# Background processing (see image_tasks.py)
+# ----------------------
+def queue_variants(movie):
+    source = movie.poster.name
+    task = {'kind': ImageTask.POSTER, 'object_id': movie.pk, 'source': source}
+    if not ImageTask.objects.filter(status=ImageTask.PENDING, **task).exists():
+        ImageTask.objects.create(**task)
+
+
+def process_task(task):
+    apply_variants(task.object_id, task.source, build_variants(task.source))
+
+
+def fail_task(task):
+    slug = Movie.objects.filter(pk=task.object_id, poster=task.source).values_list('slug', flat=True).first()
+    if slug is None:
+        return
+    Movie.objects.filter(pk=task.object_id, poster=task.source).update(
+        poster_status=Movie.POSTER_FAILED, updated_at=Now())
+    caching.bump_movie_version(slug)
+    caching.bump_catalogue_version()
+
+
+def srcset(variants, fmt):
+    return ', '.join(f'{poster_storage.url(path)} {width}w' for width, path in (variants or {}).get(fmt, []))
@@ -0,0 +1,172 @@
+"""
+Full-text search over the movie catalogue.
+
+On SQLite the searchable text of every movie lives in an FTS5 table ranked
+with bm25(); on PostgreSQL each movie's weighted tsvector is stored in a
+GIN-indexed table and ranked with ts_rank().  Either way the index is kept in
+sync by the signal handlers in ``signals.py``, so a search reads the index
+instead of every movie.  Any other backend falls back to plain ``icontains``
+filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Movie
+
+FTS_TABLE = 'movies_app_movie_fts'
+PG_TABLE = 'movies_app_movie_search'
+
+# bm25() weights, in FTS column order: title, actors, category, description
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+# The weighted document of each movie m (joined to its category c) stored in PG_TABLE.
+PG_DOCUMENT = (
+    "setweight(to_tsvector(m.title), 'A') || "
+    "setweight(to_tsvector(m.actors), 'B') || "
+    "setweight(to_tsvector(COALESCE(c.name, '')), 'C') || "
+    "setweight(to_tsvector(m.description), 'D')"
+)
+PG_INSERT = (
+    'INSERT INTO %s (movie_id, document) '
+    'SELECT m.id, %s '
+    'FROM movies_app_movie m LEFT JOIN movies_app_category c ON c.id = m.category_id' % (PG_TABLE, PG_DOCUMENT)
+)
+
+
+def fts_match_expression(tokens):
+    # Every token is quoted so FTS5 operators typed by users are matched as
+    # plain words, and starred so a partial last word still finds results.
+    return ' '.join('"%s"*' % token for token in tokens)
+
+
+def search_movies(query, queryset=None):
+    """Return ``queryset`` narrowed to movies matching ``query``, best match first."""
+    if queryset is None:
+        queryset = Movie.objects.all()
+    if not query.strip():
+        return queryset
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(queryset, tokens)
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, query)
+    return _icontains_search(queryset, query)
+
+
+def _sqlite_search(queryset, tokens):
+    movie_table = Movie._meta.db_table
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[
+            '%s.rowid = %s.id' % (FTS_TABLE, movie_table),
+            '%s MATCH %%s' % FTS_TABLE,
+        ],
+        params=[fts_match_expression(tokens)],
+        select={'search_rank': 'bm25(%s, %s)' % (FTS_TABLE, weights)},
+        order_by=['search_rank', '-id'],
+    )
+
+
+def _postgres_search(queryset, query):
+    movie_table = Movie._meta.db_table
+    return queryset.extra(
+        tables=[PG_TABLE],
+        where=[
+            '%s.movie_id = %s.id' % (PG_TABLE, movie_table),
+            '%s.document @@ websearch_to_tsquery(%%s)' % PG_TABLE,
+        ],
+        params=[query],
+        select={'search_rank': 'ts_rank(%s.document, websearch_to_tsquery(%%s))' % PG_TABLE},
+        select_params=[query],
+        order_by=['-search_rank', '-id'],
+    )
+
+
+def _icontains_search(queryset, query):
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(actors__icontains=query) |
+        Q(category__name__icontains=query)
+    ).distinct()
+
+
+# ----------------------
+# Index maintenance (SQLite and PostgreSQL)
+# ----------------------
+def uses_fts_table():
+    return connection.vendor == 'sqlite'
+
+
+def uses_pg_table():
+    return connection.vendor == 'postgresql'
+
+
+def index_movie(movie):
+    if uses_pg_table():
+        # Built from the saved row, so the document matches what was stored.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                PG_INSERT + ' WHERE m.id = %s '
+                'ON CONFLICT (movie_id) DO UPDATE SET document = EXCLUDED.document',
+                [movie.pk],
+            )
+        return
+    if not uses_fts_table():
+        return
+    category = movie.category.name if movie.category_id else ''
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [movie.pk])
+        cursor.execute(
+            'INSERT INTO %s (rowid, title, actors, category, description) '
+            'VALUES (%%s, %%s, %%s, %%s, %%s)' % FTS_TABLE,
+            [movie.pk, movie.title, movie.actors, category, movie.description],
+        )
+
+
+def unindex_movie(movie_id):
+    if uses_pg_table():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE movie_id = %%s' % PG_TABLE, [movie_id])
+        return
+    if not uses_fts_table():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [movie_id])
+
+
+def reindex_movies(movie_ids):
+    for movie in Movie.objects.filter(pk__in=movie_ids).select_related('category'):
+        index_movie(movie)
+
+
+def rebuild_index():
+    """Repopulate the search table from scratch; returns the number of rows indexed."""
+    if uses_pg_table():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % PG_TABLE)
+            cursor.execute(PG_INSERT)
+            return cursor.rowcount
+    if not uses_fts_table():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % FTS_TABLE)
+        cursor.execute(
+            'INSERT INTO %s (rowid, title, actors, category, description) '
+            'SELECT m.id, m.title, m.actors, COALESCE(c.name, \'\'), m.description '
+            'FROM movies_app_movie m LEFT JOIN movies_app_category c ON c.id = m.category_id'
+            % FTS_TABLE
+        )
+        return cursor.rowcount
@@ -0,0 +1,183 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import avatars, caching, counters, fuzzy, posters, search, typeahead
+from .models import Category, Comment, Favorite, Movie, Profile
+
+
+# ----------------------
+# Search and typeahead indexes
+# ----------------------
+@receiver(post_save, sender=Movie)
+def index_saved_movie(sender, instance, **kwargs):
+    search.index_movie(instance)
+    typeahead.movie_saved(instance)
+    fuzzy.index_movie(instance)
+
+
+@receiver(pre_delete, sender=Movie)
+def remember_movie_terms(sender, instance, **kwargs):
+    instance._search_term_ids = list(instance.search_terms.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_deleted_movie(sender, instance, **kwargs):
+    search.unindex_movie(instance.pk)
+    typeahead.movie_deleted(instance.pk)
+    fuzzy.delete_orphan_terms(getattr(instance, '_search_term_ids', []))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_movies(sender, instance, created, **kwargs):
+    typeahead.category_saved(instance)
+    if not created:
+        movie_ids = list(instance.movies.values_list('pk', flat=True))
+        search.reindex_movies(movie_ids)
+        typeahead.movies_recategorized(movie_ids)
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_movies(sender, instance, **kwargs):
+    # on_delete=SET_NULL runs as a bulk UPDATE, so collect the affected movies
+    # before they lose their category.
+    instance._movie_ids = list(instance.movies.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_uncategorized_movies(sender, instance, **kwargs):
+    movie_ids = getattr(instance, '_movie_ids', [])
+    search.reindex_movies(movie_ids)
+    typeahead.category_deleted(instance.pk)
+    typeahead.movies_recategorized(movie_ids)
+
+
+@receiver(post_save, sender=Favorite)
+def count_new_favorite(sender, instance, created, **kwargs):
+    if created:
+        typeahead.favorite_changed(instance.movie_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def count_removed_favorite(sender, instance, **kwargs):
+    typeahead.favorite_changed(instance.movie_id, -1)
+
+
+# ----------------------
+# Poster variants
+# ----------------------
+@receiver(pre_save, sender=Movie)
+def mark_new_poster_pending(sender, instance, **kwargs):
+    if instance.poster and not instance.poster._committed:
+        instance.poster_status = Movie.POSTER_PENDING
+
+
+@receiver(post_save, sender=Movie)
+def queue_poster_variants(sender, instance, **kwargs):
+    if instance.poster_status == Movie.POSTER_PENDING:
+        posters.queue_variants(instance)
+
+
+# ----------------------
+# Avatar variants
+# ----------------------
+@receiver(pre_save, sender=Profile)
+def reset_changed_avatar(sender, instance, **kwargs):
+    uploaded = bool(instance.avatar) and not instance.avatar._committed
+    cleared = not instance.avatar and bool(instance.avatar_variants)
+    if uploaded or cleared:
+        # The old variants show the old picture; the initial stands in until the new ones are built.
+        instance.avatar_variants = {}
+        instance._avatar_changed = True
+
+
+@receiver(post_save, sender=Profile)
+def queue_avatar_variants(sender, instance, **kwargs):
+    if getattr(instance, '_avatar_changed', False):
+        instance._avatar_changed = False
+        avatars.invalidate(instance.user_id)
+        if instance.avatar:
+            avatars.queue_variants(instance)
+
+
+# ----------------------
+# Counters
+# ----------------------
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(instance.movie_id, 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_removed_comment(sender, instance, **kwargs):
+    counters.adjust(instance.movie_id, 'comment_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def count_new_favorite_on_movie(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(instance.movie_id, 'favorite_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def count_removed_favorite_on_movie(sender, instance, **kwargs):
+    counters.adjust(instance.movie_id, 'favorite_count', -1)
+
+
+# ----------------------
+# Cache versions
+# ----------------------
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalogue_version(sender, **kwargs):
+    # Runs after the index handlers above, which have already applied the change.
+    typeahead.catalogue_changed(caching.bump_catalogue_version())
+
+
+@receiver(pre_save, sender=Movie)
+def remember_movie_slug(sender, instance, **kwargs):
+    # A changed slug leaves a cached payload and skeleton behind under the old one.
+    instance._old_slug = None
+    if not instance._state.adding:
+        instance._old_slug = Movie.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def bump_movie_version(sender, instance, **kwargs):
+    caching.bump_movie_version(instance.slug)
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug and old_slug != instance.slug:
+        caching.bump_movie_version(old_slug)
+
+
+@receiver(post_save, sender=Category)
+def bump_category_movie_versions(sender, instance, created, **kwargs):
+    if not created:
+        for slug in instance.movies.values_list('slug', flat=True):
+            caching.bump_movie_version(slug)
+
+
+@receiver(post_delete, sender=Category)
+def bump_uncategorized_movie_versions(sender, instance, **kwargs):
+    movie_ids = getattr(instance, '_movie_ids', [])
+    for slug in Movie.objects.filter(pk__in=movie_ids).values_list('slug', flat=True):
+        caching.bump_movie_version(slug)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_favorites_version(sender, instance, **kwargs):
+    caching.bump_favorites_version(instance.user_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_related_movie_version(sender, instance, **kwargs):
+    slug = Movie.objects.filter(pk=instance.movie_id).values_list('slug', flat=True).first()
+    if slug:
+        caching.bump_movie_version(slug)
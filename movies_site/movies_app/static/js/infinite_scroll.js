@@ -0,0 +1,47 @@
+// Appends the next batch of items (movie cards, comments) to a list when its
+// end scrolls into view, using a JSON feed instead of a full page load.  Without
+// JavaScript the regular Previous/Next links keep working.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-feed-url]').forEach(function (grid) {
+        var nextCursor = grid.dataset.nextCursor;
+        var pagination = document.querySelector(grid.dataset.pagination);
+        if (!nextCursor || !('IntersectionObserver' in window)) {
+            return;
+        }
+        if (pagination) {
+            pagination.hidden = true;
+        }
+        var sentinel = document.createElement('div');
+        grid.after(sentinel);
+        var loading = false;
+
+        var observer = new IntersectionObserver(function (entries) {
+            if (!entries[0].isIntersecting || loading || !nextCursor) {
+                return;
+            }
+            loading = true;
+            var params = new URLSearchParams(window.location.search);
+            new URLSearchParams(grid.dataset.feedParams || '').forEach(function (value, key) {
+                params.set(key, value);
+            });
+            params.set('cursor', nextCursor);
+            fetch(grid.dataset.feedUrl + '?' + params.toString(), {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    grid.insertAdjacentHTML('beforeend', data.html);
+                    nextCursor = data.next_cursor;
+                    if (!nextCursor) {
+                        observer.disconnect();
+                    }
+                })
+                .catch(function () {
+                    observer.disconnect();
+                    if (pagination) {
+                        pagination.hidden = false;
+                    }
+                })
+                .finally(function () { loading = false; });
+        }, {rootMargin: '600px'});
+        observer.observe(sentinel);
+    });
+});
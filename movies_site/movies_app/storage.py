@@ -0,0 +1,69 @@
+"""
+Content-addressed file storage for uploads.
+
+Every saved file is named after the SHA-256 of its bytes, under the directory
+it was uploaded to and two levels of hash-prefix shards::
+
+    posters/3f/a2/3fa2c1...e9.jpg
+
+Saving bytes that are already stored returns the existing name without
+writing anything, so identical uploads share one file; the file's mtime is
+refreshed, so ``gc_media`` treats it as new again.  Because a name can
+only ever hold one content, files are served with immutable far-future
+cache headers (see ``media.py``).
+
+Shared files must not be deleted when one reference goes away; unreferenced
+files are removed by ``manage.py gc_media`` instead.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+
+def is_hashed_name(name):
+    return HASHED_NAME_RE.search(name) is not None
+
+
+def content_hash(content):
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        # Two writers of the same name always write the same bytes.
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        digest = content_hash(content)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # The new reference may not be committed yet; restart the grace period.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The name is derived from the content, so an existing file is the same file.
+        return name
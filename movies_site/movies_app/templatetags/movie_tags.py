@@ -0,0 +1,123 @@
+import hashlib
+import time
+
+from django import template
+from django.core.cache import cache
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.template.loader import render_to_string
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from movies_app import avatars, metrics, posters
+from movies_app.models import Movie
+from movies_app.donut import hole_marker, render_hole
+
+register = template.Library()
+
+CARD_TIMEOUT = 60 * 60 * 24
+
+# Shown instead of the upload until its variants are ready, or for good if they failed.
+PLACEHOLDER_POSTERS = {
+    Movie.POSTER_PENDING: 'img/poster-placeholder.svg',
+    Movie.POSTER_FAILED: 'img/poster-unavailable.svg',
+}
+
+# Cached card fragments are shared by all users; the per-user favorite heart is
+# put in their place here at render time.
+FAVORITE_SLOT = '<!--favorite-heart-->'
+
+
+def card_cache_key(movie, show_category):
+    # updated_at changes on every save, so an edited movie gets a new key
+    # and the old fragment simply expires.  The category name is part of the
+    # key because renaming a category does not touch its movies.
+    extra = hashlib.md5(f'{movie.category_name}|{show_category}'.encode()).hexdigest()[:12]
+    return f'card:{movie.id}:{movie.updated_at.timestamp()}:{extra}'
+
+
+@register.simple_tag(takes_context=True)
+def movie_cards(context, movies, show_category=True):
+    """Render a grid's cards, reusing cached fragments with a single get_many()."""
+    movies = list(movies)
+    keys = [card_cache_key(movie, show_category) for movie in movies]
+    fragments = cache.get_many(keys)
+    missing = {}
+    started = time.perf_counter()
+    for movie, key in zip(movies, keys):
+        if key not in fragments:
+            fragments[key] = missing[key] = render_to_string(
+                'movies/_movie_card.html', {'movie': movie, 'show_category': show_category})
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        metrics.incr('card_cache.render_us', round((time.perf_counter() - started) * 1e6))
+    metrics.incr('card_cache.hits', len(movies) - len(missing))
+    metrics.incr('card_cache.misses', len(missing))
+    return mark_safe(''.join(
+        fragments[key].replace(
+            FAVORITE_SLOT, donut_hole(context, 'movies/holes/favorite_heart.html', movie_id=movie.id), 1)
+        for movie, key in zip(movies, keys)
+    ))
+
+
+@register.simple_tag(takes_context=True)
+def donut_hole(context, template_name, **kwargs):
+    """A per-user region: rendered inline, or left as a marker in a cached skeleton."""
+    if context.get('donut_skeleton'):
+        return mark_safe(hole_marker(template_name, kwargs))
+    return render_hole(template_name, context, kwargs)
+
+
+def _field(movie, name):
+    # Cards are MovieCard objects, the detail page gets a payload dict.
+    return movie[name] if isinstance(movie, dict) else getattr(movie, name)
+
+
+@register.simple_tag
+def poster_picture(movie, preset, css_class=''):
+    """A <picture> offering the poster's AVIF/WebP variants, falling back to the original upload."""
+    options = posters.PICTURE_PRESETS[preset]
+    attrs = {'src': _field(movie, 'poster_url'), 'alt': _field(movie, 'title'), **options['attrs']}
+    if css_class:
+        attrs['class'] = css_class
+    status = _field(movie, 'poster_status')
+    if status != Movie.POSTER_READY:
+        # Still being processed, or unreadable: don't send the raw upload.
+        attrs.update(src=static(PLACEHOLDER_POSTERS[status]), width=options['width'], height=options['width'] * 3 // 2)
+        return format_html('<img{}>', flatatt(attrs))
+    variants = _field(movie, 'poster_variants') or {}
+    width, height = _field(movie, 'poster_width'), _field(movie, 'poster_height')
+    if width and height:
+        attrs['width'] = options['width']
+        attrs['height'] = round(height * options['width'] / width)
+    lqip = _field(movie, 'poster_lqip')
+    if lqip:
+        # Painted behind the image until it has loaded; no extra request.
+        attrs['style'] = f'background: center / cover no-repeat url({lqip})'
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((fmt, posters.srcset(variants, fmt), options['sizes']) for fmt in posters.FORMATS if variants.get(fmt)),
+    )
+    return format_html('<picture>{}<img{}></picture>', sources, flatatt(attrs))
+
+
+@register.filter
+def avatar_url(variants, preset):
+    """``{{ profile.avatar_variants|avatar_url:"small" }}``: the variant for a preset, or ''."""
+    return avatars.variant_url(variants, avatars.AVATAR_PRESETS[preset])
+
+
+@register.simple_tag
+def avatar_img(variants, username, preset='small'):
+    """A square avatar with a 2x source, or the user's initial until variants exist."""
+    size = avatars.AVATAR_PRESETS[preset]
+    src = avatars.variant_url(variants, size)
+    if not src:
+        return format_html(
+            '<span class="avatar avatar-initial" style="width:{0}px;height:{0}px;line-height:{0}px">{1}</span>',
+            size, username[:1].upper())
+    attrs = {'src': src, 'alt': '', 'width': size, 'height': size, 'loading': 'lazy', 'decoding': 'async'}
+    retina = avatars.variant_url(variants, size * 2)
+    if retina != src:
+        attrs['srcset'] = f'{src} 1x, {retina} 2x'
+    return format_html('<img class="avatar"{}>', flatatt(attrs))
@@ -1,3 +1,1254 @@
-from django.test import TestCase
+import base64
+import gzip
+import importlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404, QueryDict
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from . import (
+    assets, caching, counters, detail, facets, fuzzy, image_tasks, imaging, media, metrics, pagination, posters,
+    search, typeahead,
+)
+from .cards import MovieCard, card_queryset, cards, cards_in_order
+from .donut import fill_holes, hole_marker
+from .favorites import favorite_ids
+from .forms import ProfileForm
+from .models import Category, Comment, Favorite, ImageTask, Movie, SearchTerm
+from .pagination import KeysetPaginator
+from .views import MOVIE_LIST_SORTS
+
+
+def make_movie(user, title, category=None, **fields):
+    values = {
+        'slug': fields.pop('slug', None) or title.lower().replace(' ', '-'),
+        'poster': 'posters/x.png',
+        'description': 'A film',
+        'release_date': date(1999, 1, 1),
+        'actors': 'Tom Hanks',
+        'rating': Decimal('7.5'),
+    }
+    values.update(fields)
+    return Movie.objects.create(title=title, category=category, created_by=user, **values)
+
+
+# Pages link static files through the manifest, which only exists after
+# collectstatic.  Tests get a private in-process cache; see
+# WorkerCacheTests for the shared one.
+@override_settings(STORAGES={
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MovieTestCase(TestCase):
+    def setUp(self):
+        # Versions and cached pages live in the process-wide locmem cache.
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='pw')
+        self.drama = Category.objects.create(name='Drama', slug='drama')
+
+
+class SearchTests(MovieTestCase):
+    def titles(self, query):
+        return [movie.title for movie in search.search_movies(query)]
+
+    def test_title_match_ranks_above_description_match(self):
+        make_movie(self.user, 'Quiet Days', description='A heist goes wrong')
+        make_movie(self.user, 'Heist')
+        self.assertEqual(self.titles('heist'), ['Heist', 'Quiet Days'])
+
+    def test_partial_last_word_matches(self):
+        make_movie(self.user, 'The Godfather')
+        self.assertEqual(self.titles('godf'), ['The Godfather'])
+
+    def test_fts_syntax_is_not_interpreted(self):
+        make_movie(self.user, 'Heat')
+        for query in ('"heat', 'heat*', '-heat', 'heat)', '(heat'):
+            with self.subTest(query=query):
+                self.assertEqual(self.titles(query), ['Heat'])
+        # Operators are words like any other, so they must match too.
+        self.assertEqual(self.titles('heat OR'), [])
+
+    def test_query_without_words_matches_nothing(self):
+        make_movie(self.user, 'Heat')
+        self.assertEqual(self.titles('!!'), [])
+
+    def test_search_view_with_punctuation_only_finds_nothing(self):
+        make_movie(self.user, 'Heat')
+        self.client.force_login(self.user)
+        for query in ('*', '"', '!?'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('search_results'), {'q': query})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['movies']), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        movie = make_movie(self.user, 'Heat')
+        movie.title = 'Ronin'
+        movie.save()
+        self.assertEqual(self.titles('heat'), [])
+        self.assertEqual(self.titles('ronin'), ['Ronin'])
+        movie.delete()
+        self.assertEqual(self.titles('ronin'), [])
+
+    def test_renaming_a_category_reindexes_its_movies(self):
+        make_movie(self.user, 'Heat', self.drama)
+        self.drama.name = 'Crime'
+        self.drama.save()
+        self.assertEqual(self.titles('crime'), ['Heat'])
+
+    def test_rebuild_index(self):
+        make_movie(self.user, 'Heat', self.drama)
+        search.unindex_movie(Movie.objects.get().pk)
+        self.assertEqual(search.rebuild_index(), 1)
+        self.assertEqual(self.titles('drama'), ['Heat'])
+
+    def test_search_view(self):
+        make_movie(self.user, 'Heat')
+        make_movie(self.user, 'Ronin')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search_results'), {'q': 'ronin'})
+        self.assertEqual([movie.title for movie in response.context['movies']], ['Ronin'])
+
+
+class TypeaheadTests(MovieTestCase):
+    def complete(self, prefix):
+        return [label for (kind, label), score in typeahead.get_index().complete(prefix)]
+
+    def test_completes_any_word_start(self):
+        make_movie(self.user, 'The Dark Knight', actors='Christian Bale, Heath Ledger')
+        self.assertEqual(self.complete('knig'), ['The Dark Knight'])
+        self.assertEqual(self.complete('ledg'), ['Heath Ledger'])
+        self.assertEqual(self.complete('  THE   dark '), ['The Dark Knight'])
+
+    def test_ranks_by_favorites(self):
+        make_movie(self.user, 'Heat')
+        heaven = make_movie(self.user, 'Heaven Can Wait')
+        self.assertEqual(self.complete('hea'), ['Heat', 'Heaven Can Wait'])
+        Favorite.objects.create(user=self.user, movie=heaven)
+        self.assertEqual(self.complete('hea'), ['Heaven Can Wait', 'Heat'])
+
+    def test_follows_changes_in_this_process(self):
+        movie = make_movie(self.user, 'Heat', self.drama)
+        index = typeahead.get_index()
+        movie.title = 'Ronin'
+        movie.save()
+        self.drama.delete()
+        self.assertIs(typeahead.get_index(), index)
+        self.assertEqual(self.complete('hea'), [])
+        self.assertEqual(self.complete('ron'), ['Ronin'])
+        self.assertEqual(self.complete('dra'), [])
+
+    def test_rebuilds_after_a_change_elsewhere(self):
+        movie = make_movie(self.user, 'Heat')
+        index = typeahead.get_index()
+        # Another worker's save: the row changes and the shared version moves,
+        # but this process's signal handlers never run.
+        Movie.objects.filter(pk=movie.pk).update(title='Ronin')
+        caching.bump_catalogue_version()
+        self.assertIsNot(typeahead.get_index(), index)
+        self.assertEqual(self.complete('ron'), ['Ronin'])
+
+    def test_long_titles_are_indexed_within_bounds(self):
+        title = ' '.join(['word%d' % i for i in range(60)])
+        make_movie(self.user, title, slug='long')
+        self.assertEqual(self.complete('word0 word1'), [title])
+        self.assertEqual(self.complete('word3 '), [title])
+        self.assertEqual(self.complete('word30'), [])
+        self.assertTrue(all(len(key) <= typeahead.MAX_KEY_LENGTH for key in typeahead.prefix_keys(title)))
+        # A prefix longer than the indexed keys still finds the title.
+        self.assertEqual(self.complete(title[:80]), [title])
+
+    def test_suggest_view(self):
+        make_movie(self.user, 'Heat', self.drama)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search_suggest'), {'q': 'he', 'limit': 1})
+        self.assertEqual(response.json(), {'query': 'he', 'results': [{'value': 'Heat', 'kind': 'title'}]})
+
+
+class FuzzyTests(MovieTestCase):
+    def test_finds_misspelled_titles_and_actors(self):
+        make_movie(self.user, 'The Godfather', actors='Marlon Brando, Al Pacino')
+        self.assertEqual(fuzzy.similar_terms('godfathr')[0][0].text, 'The Godfather')
+        self.assertEqual(fuzzy.similar_terms('pacinno')[0][0].text, 'Al Pacino')
+        self.assertEqual(fuzzy.similar_terms('zzzz'), [])
+
+    def test_pruning_loses_no_matches(self):
+        make_movie(self.user, 'Heat', actors='Al Pacino, Robert De Niro, Val Kilmer')
+        make_movie(self.user, 'Heaven Can Wait', actors='Warren Beatty')
+        make_movie(self.user, 'The Heat Is On in the Heart of the Heartland', slug='heartland')
+        for query in ['heat', 'hea', 'heaven', 'heart', 'al pacino', 'de niro', 'the heat is on']:
+            grams = fuzzy.trigrams(query)
+            expected = []
+            for term in SearchTerm.objects.prefetch_related('trigrams'):
+                common = len(grams & {trigram.gram for trigram in term.trigrams.all()})
+                similarity = common / (len(grams) + term.gram_count - common)
+                if similarity >= fuzzy.SIMILARITY_THRESHOLD:
+                    expected.append(term.text)
+            self.assertEqual(
+                sorted(term.text for term, similarity in fuzzy.similar_terms(query, limit=100)),
+                sorted(expected), query)
+
+    def test_long_actor_names_are_truncated(self):
+        actor = 'Firstname ' + 'Lastname' * 100
+        movie = make_movie(self.user, 'Heat', actors=actor)
+        term = movie.search_terms.get(normalized__startswith='firstname')
+        self.assertEqual(len(term.normalized), fuzzy.MAX_TERM_LENGTH)
+        self.assertEqual(term.trigrams.filter(term_gram_count=term.gram_count).count(), term.gram_count)
+        self.assertEqual(fuzzy.similar_terms('firstnme')[0][0], term)
+
+    def test_trigram_migration_truncates_long_actor_names(self):
+        migration = importlib.import_module('movies_app.migrations.0003_search_trigrams')
+        make_movie(self.user, 'Heat', actors='Firstname ' + 'Lastname' * 100)
+        SearchTerm.objects.all().delete()
+        migration.index_existing_movies(django_apps, None)
+        term = SearchTerm.objects.get(normalized__startswith='firstname')
+        self.assertEqual(len(term.normalized), fuzzy.MAX_TERM_LENGTH)
+        self.assertEqual(len(term.text), fuzzy.MAX_TEXT_LENGTH)
+
+    def test_search_view_suggests_a_spelling(self):
+        make_movie(self.user, 'The Godfather')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search_results'), {'q': 'godfathr'})
+        self.assertEqual(response.context['suggestion'], 'The Godfather')
+        self.assertEqual([movie.title for movie in response.context['movies']], ['The Godfather'])
+
+
+class FacetTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        self.comedy = Category.objects.create(name='Comedy', slug='comedy')
+        make_movie(self.user, 'Heat', self.drama, release_date=date(1995, 12, 15), rating=Decimal('8.3'))
+        make_movie(self.user, 'Heathers', self.comedy, release_date=date(1989, 3, 31), rating=Decimal('7.1'))
+        make_movie(self.user, 'Heat Wave', self.drama, release_date=date(2000, 1, 1), rating=Decimal('10.0'))
+
+    def search(self, **params):
+        self.client.force_login(self.user)
+        return self.client.get(reverse('search_results'), {'q': 'heat*', **params})
+
+    def titles(self, response):
+        return sorted(movie.title for movie in response.context['movies'])
+
+    def test_counts_each_facet(self):
+        counts = facets.facet_counts(Movie.objects.all(), QueryDict('q=heat&page=2&decade=1990'))
+        self.assertEqual(
+            [(option['label'], option['count']) for option in counts['category']],
+            [('Comedy', 1), ('Drama', 2)])
+        self.assertEqual(
+            [(option['label'], option['selected'], option['url']) for option in counts['decade']],
+            [('2000s', False, '?q=heat&decade=2000'), ('1990s', True, '?q=heat'),
+             ('1980s', False, '?q=heat&decade=1980')])
+        self.assertEqual([option['label'] for option in counts['rating']], ['10.0', '8.0 - 8.9', '7.0 - 7.9'])
+
+    def test_filters_by_facets(self):
+        self.assertEqual(self.titles(self.search(decade=1990)), ['Heat'])
+        self.assertEqual(self.titles(self.search(decade=2000)), ['Heat Wave'])
+        self.assertEqual(self.titles(self.search(category='drama', rating=10)), ['Heat Wave'])
+        self.assertEqual(self.titles(self.search(rating=7)), ['Heathers'])
+
+    def test_decade_bounds(self):
+        self.assertEqual(self.titles(self.search(decade=9990)), [])
+        self.assertEqual(self.titles(self.search(decade=0)), [])
+        # Not a decade, out of range or not a number: the filter is ignored.
+        for decade in ['1995', '10000', '-10', 'x']:
+            response = self.search(decade=decade)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.titles(response), ['Heat', 'Heat Wave', 'Heathers'], decade)
+
+
+class SearchCacheTests(MovieTestCase):
+    def search(self, query, **params):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search_results'), {'q': query, **params})
+        return [movie.title for movie in response.context['movies']]
+
+    def test_key_normalizes_the_query_and_includes_facets(self):
+        key = caching.search_results_key(QueryDict('q=Heat'), 1)
+        self.assertEqual(caching.search_results_key(QueryDict('q=%20heat%20%20'), 1), key)
+        self.assertNotEqual(caching.search_results_key(QueryDict('q=heat'), 2), key)
+        self.assertNotEqual(caching.search_results_key(QueryDict('q=heat&decade=1990'), 1), key)
+
+    def test_pages_are_cached_until_the_catalogue_changes(self):
+        movie = make_movie(self.user, 'Heat')
+        self.assertEqual(self.search('heat'), ['Heat'])
+        # A change that bypasses the signals leaves the cached page in place...
+        Movie.objects.filter(pk=movie.pk).update(description='A heist')
+        self.assertEqual(self.search('HEAT'), ['Heat'])
+        # ...and any save moves the catalogue version on.
+        make_movie(self.user, 'Heat 2', slug='heat-2')
+        self.assertEqual(sorted(self.search('heat')), ['Heat', 'Heat 2'])
+
+    def test_cached_page_keeps_suggestion_and_facets(self):
+        make_movie(self.user, 'The Godfather', self.drama)
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('search_results'), {'q': 'godfathr'})
+        # Session and user, then the cards by id: no search, count or facets.
+        with self.assertNumQueries(3):
+            second = self.client.get(reverse('search_results'), {'q': 'godfathr'})
+        for name in ['suggestion', 'facets']:
+            self.assertEqual(second.context[name], first.context[name])
+
+
+class KeysetPaginationTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        # Two ratings, so most of each page is decided by the id tie-breaker.
+        for i in range(5):
+            make_movie(self.user, 'Movie %d' % i, rating=Decimal('7.5') if i % 2 else Decimal('8.0'))
+        self.expected = list(Movie.objects.order_by('-rating', '-id').values_list('title', flat=True))
+        self.paginator = KeysetPaginator(Movie.objects.all(), 2, MOVIE_LIST_SORTS['rating'][1])
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_pages_forward_and_back(self):
+        pages = self.walk(self.paginator)
+        self.assertEqual([[movie.title for movie in page] for page in pages],
+                         [self.expected[0:2], self.expected[2:4], self.expected[4:]])
+        self.assertFalse(pages[0].has_previous())
+        back = self.paginator.page(pages[2].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        first = self.paginator.page(back.previous_cursor)
+        self.assertEqual(first.object_list, pages[0].object_list)
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_cursors_round_trip_datetimes_and_decimals(self):
+        paginator = KeysetPaginator(Movie.objects.all(), 1, ('rating', '-created_at'))
+        self.assertEqual(len(self.walk(paginator)), 5)
+
+    def test_old_cursor_survives_deleting_its_row(self):
+        page = self.paginator.page()
+        page.object_list[-1].delete()
+        following = self.paginator.page(page.next_cursor)
+        self.assertEqual([movie.title for movie in following], self.expected[2:4])
+
+    def test_rejects_tampered_and_foreign_cursors(self):
+        cursor = self.paginator.page().next_cursor
+        tampered = cursor[:5] + ('A' if cursor[5] != 'A' else 'B') + cursor[6:]
+        for bad in [tampered, cursor + 'x', 'garbage']:
+            with self.assertRaises(Http404):
+                self.paginator.page(bad)
+        # A cursor only applies to the ordering it was made for.
+        with self.assertRaises(Http404):
+            KeysetPaginator(Movie.objects.all(), 2, MOVIE_LIST_SORTS['title'][1]).page(cursor)
+
+    def test_views_page_by_cursor(self):
+        self.client.force_login(self.user)
+        cursor = KeysetPaginator(Movie.objects.all(), 3, MOVIE_LIST_SORTS['rating'][1]).page().next_cursor
+        response = self.client.get(reverse('movie_list'), {'sort': 'rating', 'cursor': cursor})
+        self.assertEqual([movie.title for movie in response.context['movies']], self.expected[3:])
+        self.assertEqual(self.client.get(reverse('movie_list'), {'sort': 'title', 'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('movie_list'), {'cursor': 'garbage'}).status_code, 404)
+
+    def test_user_movies_shows_the_users_movies(self):
+        make_movie(User.objects.create(username='bob'), 'Not Alice')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('user_movies', args=['alice']))
+        self.assertTemplateUsed(response, 'movies/user_movies.html')
+        self.assertContains(response, 'Movies by alice')
+        for title in self.expected:
+            self.assertContains(response, title)
+        self.assertNotContains(response, 'Not Alice')
+        self.assertFalse(response.context['is_paginated'])
+        self.assertContains(response, 'data-feed-params="user=alice"')
+        html = self.client.get(reverse('movie_feed'), {'user': 'alice'}).json()['html']
+        self.assertIn('Movie 0', html)
+        self.assertNotIn('Not Alice', html)
+
+
+class CachedCountTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        make_movie(self.user, 'Heat', self.drama)
+        make_movie(self.user, 'Ronin')
+
+    def test_counts_are_cached_per_filter_until_the_catalogue_changes(self):
+        dramas = Movie.objects.filter(category=self.drama)
+        self.assertEqual(pagination.cached_count(dramas), 1)
+        self.assertEqual(pagination.cached_count(Movie.objects.all()), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(pagination.cached_count(dramas), 1)
+        make_movie(self.user, 'Heat 2', self.drama, slug='heat-2')
+        self.assertEqual(pagination.cached_count(dramas), 2)
+
+    def test_large_unfiltered_tables_are_estimated(self):
+        with mock.patch.object(pagination, 'estimated_row_count', return_value=250_000):
+            self.assertEqual(pagination.cached_count(Movie.objects.all()), 250_000)
+            # Filtered querysets and small tables are counted exactly.
+            self.assertEqual(pagination.cached_count(Movie.objects.filter(category=self.drama)), 1)
+        caching.bump_catalogue_version()
+        with mock.patch.object(pagination, 'estimated_row_count', return_value=10):
+            self.assertEqual(pagination.cached_count(Movie.objects.all()), 2)
+
+    def test_keyset_grids_never_count(self):
+        self.client.force_login(self.user)
+        for url in [reverse('movie_list'), reverse('movies_by_category', args=['drama'])]:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertFalse([query for query in queries if 'COUNT(' in query['sql']], url)
+
+
+class MovieCardTests(MovieTestCase):
+    def test_cards_come_from_one_narrow_query(self):
+        heat = make_movie(self.user, 'Heat', self.drama)
+        queryset = card_queryset(Movie.objects.order_by('title'))
+        self.assertNotIn('description', str(queryset.query))
+        with self.assertNumQueries(1):
+            card, = cards(queryset)
+        self.assertIsInstance(card, MovieCard)
+        self.assertEqual((card.pk, card.title, card.category_name), (heat.pk, 'Heat', 'Drama'))
+        self.assertEqual(card.url, heat.get_absolute_url())
+        self.assertEqual(card.poster_url, heat.poster.url)
+
+    def test_cards_in_order(self):
+        heat, ronin = make_movie(self.user, 'Heat'), make_movie(self.user, 'Ronin')
+        self.assertEqual([card.title for card in cards_in_order([ronin.pk, 999, heat.pk])], ['Ronin', 'Heat'])
+
+    def test_grids_render_cards(self):
+        make_movie(self.user, 'Heat', self.drama)
+        self.client.force_login(self.user)
+        for url in [reverse('movie_list'), reverse('movies_by_category', args=['drama']),
+                    reverse('user_movies', args=['alice']), reverse('search_results') + '?q=heat']:
+            response = self.client.get(url)
+            self.assertEqual([type(movie) for movie in response.context['movies']], [MovieCard], url)
+
+    def test_dashboard_cards_show_title_and_link_only(self):
+        movie = make_movie(self.user, 'Heat', self.drama)
+        Favorite.objects.create(user=self.user, movie=movie)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, movie.get_absolute_url(), count=2)
+        self.assertNotContains(response, 'Rating:')
+        self.assertNotContains(response, 'Category:')
+
+
+class MovieListSortTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        make_movie(self.user, 'Heat', self.drama, release_date=date(1995, 12, 15), rating=Decimal('8.3'))
+        make_movie(self.user, 'Alien', release_date=date(1979, 5, 25), rating=Decimal('8.5'))
+        make_movie(self.user, 'Ronin', self.drama, release_date=date(1998, 9, 25), rating=Decimal('7.2'))
+        self.client.force_login(self.user)
+
+    def titles(self, **params):
+        response = self.client.get(reverse('movie_list'), params)
+        return [movie.title for movie in response.context['movies']]
+
+    def test_sorts(self):
+        self.assertEqual(self.titles(), ['Ronin', 'Alien', 'Heat'])
+        self.assertEqual(self.titles(sort='rating'), ['Alien', 'Heat', 'Ronin'])
+        self.assertEqual(self.titles(sort='release_date'), ['Ronin', 'Heat', 'Alien'])
+        self.assertEqual(self.titles(sort='title'), ['Alien', 'Heat', 'Ronin'])
+
+    def test_filters(self):
+        self.assertEqual(self.titles(category='drama', sort='title'), ['Heat', 'Ronin'])
+        self.assertEqual(self.titles(year=1995), ['Heat'])
+        self.assertEqual(self.client.get(reverse('movie_list'), {'category': 'horror'}).status_code, 404)
+        for params in [{'sort': 'description'}, {'sort': 'rating', 'year': 1995}, {'year': 'x'}]:
+            self.assertEqual(self.client.get(reverse('movie_list'), params).status_code, 400, params)
+
+    def test_sort_options_have_labels(self):
+        response = self.client.get(reverse('movie_list'), {'sort': 'release_date'})
+        self.assertContains(response, '<option value="release_date" selected>Release date</option>', html=True)
+        self.assertContains(response, '<option value="rating">Top rated</option>', html=True)
+
+
+class MovieFeedTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(14):
+            make_movie(self.user, 'Movie %02d' % i, self.drama)
+        self.client.force_login(self.user)
+
+    def test_feed_continues_the_page(self):
+        page = self.client.get(reverse('movie_list'))
+        cursor = page.context['page_obj'].next_cursor
+        data = self.client.get(reverse('movie_feed'), {'cursor': cursor}).json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['html'].count('class="card"'), 2)
+        self.assertIn('Movie 01', data['html'])
+        self.assertNotIn('<html', data['html'])
+
+    def test_cards_match_the_originating_page(self):
+        category_line = '<p class="mb-2">Category: Drama</p>'
+        page = self.client.get(reverse('movies_by_category', args=['drama']))
+        self.assertNotContains(page, category_line)
+        self.assertContains(page, 'data-feed-params="category=drama&amp;show_category=0"')
+        cursor = page.context['page_obj'].next_cursor
+        html = self.client.get(reverse('movie_feed'), {'cursor': cursor, 'category': 'drama', 'show_category': '0'}).json()['html']
+        self.assertNotIn(category_line, html)
+        html = self.client.get(reverse('movie_feed'), {'cursor': cursor}).json()['html']
+        self.assertIn(category_line, html)
+
+
+class CardCacheTests(MovieTestCase):
+    def render(self, show_category=True):
+        template = Template('{% load movie_tags %}{% movie_cards movies show_category=show_category %}')
+        movies = cards(card_queryset(Movie.objects.order_by('title')))
+        return template.render(Context({'movies': movies, 'show_category': show_category, 'favorite_ids': set()}))
+
+    def counters(self):
+        snapshot = metrics.snapshot()
+        return snapshot['card_cache.hits'], snapshot['card_cache.misses']
+
+    def test_fragments_are_reused_until_the_movie_changes(self):
+        movie = make_movie(self.user, 'Heat', self.drama)
+        make_movie(self.user, 'Ronin')
+        html = self.render()
+        self.assertEqual(self.counters(), (0, 2))
+        self.assertEqual(self.render(), html)
+        self.assertEqual(self.counters(), (2, 2))
+        movie.rating = Decimal('8.3')
+        movie.save()
+        self.assertIn('Rating: 8.3/10', self.render())
+        self.assertEqual(self.counters(), (3, 3))
+
+    def test_key_covers_category_name_and_variant(self):
+        make_movie(self.user, 'Heat', self.drama)
+        self.assertIn('Category: Drama', self.render())
+        self.assertNotIn('Category: Drama', self.render(show_category=False))
+        self.drama.name = 'Crime'
+        self.drama.save()
+        self.assertIn('Category: Crime', self.render())
+
+    def test_favorite_hearts_are_per_user(self):
+        movie = make_movie(self.user, 'Heat')
+        Favorite.objects.create(user=self.user, movie=movie)
+        bob = User.objects.create_user('bob', password='pw')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('movie_list')), 'title="In your favorites"')
+        self.client.force_login(bob)
+        self.assertNotContains(self.client.get(reverse('movie_list')), 'title="In your favorites"')
+
+    def test_metrics_are_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('metrics')).json()['card_cache.misses'], 0)
+
+
+class DonutCacheTests(MovieTestCase):
+    def test_skeleton_is_shared_and_holes_are_per_user(self):
+        make_movie(self.user, 'Heat')
+        bob = User.objects.create_user('bob', password='pw')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('movie_list')), 'Hello, alice')
+        self.client.force_login(bob)
+        # Session and user for the holes, then bob's favorites: no movie query.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('movie_list'))
+        self.assertContains(response, 'Hello, bob')
+        self.assertNotContains(response, 'Hello, alice')
+        self.assertNotContains(response, '<!--donut-hole:')
+
+    def test_skeleton_follows_the_catalogue(self):
+        make_movie(self.user, 'Heat')
+        self.client.force_login(self.user)
+        self.client.get(reverse('movie_list'))
+        make_movie(self.user, 'Ronin')
+        self.assertContains(self.client.get(reverse('movie_list')), 'Ronin')
+
+    def test_holes_are_signed(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        marker = hole_marker('movies/holes/navbar_user.html', {})
+        self.assertIn('Login', fill_holes('<p>%s</p>' % marker, request))
+        forged = marker.replace(marker[20:30], 'x' * 10)
+        with self.assertRaises(signing.BadSignature):
+            fill_holes(forged, request)
+
+
+class ConditionalGetTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        self.movie = make_movie(self.user, 'Heat')
+        self.client.force_login(self.user)
+
+    def test_list_answers_304_for_a_matching_etag(self):
+        response = self.client.get(reverse('movie_list'))
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('movie_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Another page, a favorite of this user and a catalogue change all move the ETag.
+        self.assertNotEqual(self.client.get(reverse('movie_list'), {'sort': 'title'})['ETag'], etag)
+        self.client.post(reverse('toggle_favorite', args=['heat']))
+        self.client.get(self.movie.get_absolute_url())  # shows the queued message
+        response = self.client.get(reverse('movie_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        make_movie(self.user, 'Ronin')
+        self.assertEqual(self.client.get(reverse('movie_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_answers_304_when_not_modified_since(self):
+        last_modified = self.client.get(reverse('movie_list'))['Last-Modified']
+        response = self.client.get(reverse('movies_by_category', args=['drama']), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_detail_etag_follows_the_movie(self):
+        etag = self.client.get(self.movie.get_absolute_url())['ETag']
+        self.assertEqual(self.client.get(self.movie.get_absolute_url(), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(reverse('add_comment', args=['heat']), {'content': 'Great'})
+        self.client.get(reverse('movie_list'))  # shows the queued message
+        response = self.client.get(self.movie.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Great')
+
+    def test_queued_messages_are_never_answered_with_304(self):
+        bob = User.objects.create_user('bob', password='pw')
+        comment = Comment.objects.create(movie=self.movie, user=bob, content='Mine')
+        etag = self.client.get(reverse('movie_list'))['ETag']
+        # Refused without changing anything, but it queues an error message.
+        self.client.post(reverse('delete_comment', args=[comment.pk]))
+        response = self.client.get(reverse('movie_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "permission to delete this comment")
+        self.assertEqual(self.client.get(reverse('movie_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class CommentPagingTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        self.movie = make_movie(self.user, 'Heat')
+        for i in range(detail.COMMENTS_PER_PAGE + 5):
+            author = User.objects.create(username='user%d' % i)
+            Comment.objects.create(movie=self.movie, user=author, content='Comment %02d' % i)
+        self.client.force_login(self.user)
+
+    def test_detail_shows_the_newest_page(self):
+        response = self.client.get(self.movie.get_absolute_url())
+        page = response.context['comments']
+        self.assertEqual(len(page), detail.COMMENTS_PER_PAGE)
+        self.assertEqual(page.object_list[0]['content'], 'Comment 24')
+        self.assertTrue(page.has_next())
+
+    def test_load_more_returns_the_rest_without_a_query_per_comment(self):
+        cursor = self.client.get(self.movie.get_absolute_url()).context['comments'].next_cursor
+        # Session, user, the movie id, then one query for the comments and their authors.
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse('movie_comments', args=['heat']), {'cursor': cursor}).json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['html'].count('Comment 0'), 5)
+        self.assertIn('user0', data['html'])
+        self.assertEqual(self.client.get(reverse('movie_comments', args=['heat']), {'cursor': 'x'}).status_code, 404)
+
+
+class CounterTests(MovieTestCase):
+    def setUp(self):
+        super().setUp()
+        self.movie = make_movie(self.user, 'Heat')
+
+    def counts(self):
+        return Movie.objects.values_list('comment_count', 'favorite_count').get(pk=self.movie.pk)
+
+    def test_counters_follow_comments_and_favorites(self):
+        bob = User.objects.create(username='bob')
+        comment = Comment.objects.create(movie=self.movie, user=self.user, content='Great')
+        Favorite.objects.create(movie=self.movie, user=bob)
+        self.assertEqual(self.counts(), (1, 1))
+        comment.delete()
+        bob.delete()  # cascades to the favorite
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_saving_a_stale_instance_keeps_the_counters(self):
+        stale = Movie.objects.get(pk=self.movie.pk)
+        Comment.objects.create(movie=self.movie, user=self.user, content='Great')
+        stale.title = 'Heat (1995)'
+        stale.save()
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).title, 'Heat (1995)')
+
+    def test_save_semantics_are_unchanged(self):
+        Movie.objects.filter(pk=self.movie.pk).update(comment_count=3)
+        # Fields the caller names are written as given, counters included.
+        self.movie.comment_count = 5
+        self.movie.save(update_fields=['comment_count'])
+        self.assertEqual(self.counts(), (5, 0))
+        # A row deleted in the meantime is inserted again, as with any model.
+        Movie.objects.filter(pk=self.movie.pk).delete()
+        self.movie.save()
+        self.assertEqual(self.counts(), (5, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Comment.objects.create(movie=self.movie, user=self.user, content='Great')
+        Movie.objects.filter(pk=self.movie.pk).update(comment_count=7, favorite_count=2)
+        self.assertEqual(counters.reconcile(batch_size=1), 1)
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(counters.reconcile(), 0)
+
+
+class FavoriteSetTests(MovieTestCase):
+    def test_set_is_cached_until_the_user_toggles(self):
+        heat, ronin = make_movie(self.user, 'Heat'), make_movie(self.user, 'Ronin')
+        Favorite.objects.create(user=self.user, movie=heat)
+        self.assertEqual(favorite_ids(self.user), {heat.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(favorite_ids(self.user), {heat.pk})
+        favorite = Favorite.objects.create(user=self.user, movie=ronin)
+        self.assertEqual(favorite_ids(self.user), {heat.pk, ronin.pk})
+        favorite.delete()
+        self.assertEqual(favorite_ids(self.user), {heat.pk})
+        self.assertEqual(favorite_ids(AnonymousUser()), frozenset())
+
+    def test_other_users_sets_are_untouched(self):
+        heat = make_movie(self.user, 'Heat')
+        bob = User.objects.create(username='bob')
+        favorite_ids(self.user)
+        Favorite.objects.create(user=bob, movie=heat)
+        with self.assertNumQueries(0):
+            self.assertEqual(favorite_ids(self.user), frozenset())
+        self.assertEqual(favorite_ids(bob), {heat.pk})
+
+    def test_detail_button_follows_the_set(self):
+        movie = make_movie(self.user, 'Heat')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(movie.get_absolute_url()), 'Add to Favorites')
+        self.client.post(reverse('toggle_favorite', args=['heat']))
+        self.assertContains(self.client.get(movie.get_absolute_url()), 'Remove from Favorites')
+
+
+class MovieDetailPayloadTests(MovieTestCase):
+    def test_payload_is_cached_per_movie_version(self):
+        movie = make_movie(self.user, 'Heat', self.drama)
+        payload = detail.movie_detail('heat')
+        self.assertEqual((payload['movie']['title'], payload['movie']['category_name']), ('Heat', 'Drama'))
+        with self.assertNumQueries(0):
+            self.assertEqual(detail.movie_detail('heat'), payload)
+        Comment.objects.create(movie=movie, user=self.user, content='Great')
+        self.assertEqual([comment['content'] for comment in detail.movie_detail('heat')['comments']], ['Great'])
+        self.drama.name = 'Crime'
+        self.drama.save()
+        self.assertEqual(detail.movie_detail('heat')['movie']['category_name'], 'Crime')
+
+    def test_unknown_slugs_leave_nothing_in_the_cache(self):
+        self.client.force_login(self.user)
+        self.assertIsNone(detail.movie_detail('nope'))
+        self.assertEqual(self.client.get(reverse('movie_detail', args=['nope'])).status_code, 404)
+        self.assertIsNone(caching.movie_version('nope', create=False))
+
+    def test_a_lost_version_is_recreated(self):
+        make_movie(self.user, 'Heat')
+        cache.delete('movie:heat:version')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('movie_detail', args=['heat']))
+        self.assertContains(response, 'Heat')
+        self.assertNotIn('ETag', response)
+        self.assertIsNotNone(caching.movie_version('heat', create=False))
+        self.assertIn('ETag', self.client.get(reverse('movie_detail', args=['heat'])))
+
+
+def image_upload(name='poster.png', size=(400, 600), color='red', fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=Image.MIME[fmt])
+
+
+class MediaTestCase(MovieTestCase):
+    """Uploads go to a temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def run_image_tasks(self):
+        while (task := image_tasks.claim_next()) is not None:
+            image_tasks.run_task(task)
+
+
+class PosterVariantTests(MediaTestCase):
+    def test_variants_are_built_at_each_width_without_upscaling(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload())
+        fields = posters.build_variants(movie.poster.name)
+        self.assertEqual((fields['poster_width'], fields['poster_height']), (400, 600))
+        self.assertEqual(fields['poster_variants']['source'], movie.poster.name)
+        for fmt in posters.FORMATS:
+            widths = [width for width, path in fields['poster_variants'][fmt]]
+            self.assertEqual(widths, [320, 400])
+            for width, path in fields['poster_variants'][fmt]:
+                with posters.poster_storage.open(path) as f, Image.open(f) as image:
+                    self.assertEqual((image.format.lower(), image.width), (fmt, width))
+
+    def test_pages_offer_the_variants(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload())
+        self.run_image_tasks()
+        self.client.force_login(self.user)
+        response = self.client.get(movie.get_absolute_url())
+        for fmt in posters.FORMATS:
+            self.assertContains(response, '<source type="image/%s" srcset="' % fmt)
+        self.assertContains(response, 'height="960"')
+        self.assertContains(response, 'width="640"')
+        self.assertContains(self.client.get(reverse('movie_list')), 'sizes="(min-width: 640px) 320px, 100vw"')
+
+    def test_add_is_an_ordinary_slug(self):
+        movie = make_movie(self.user, 'Add')
+        self.client.force_login(self.user)
+        self.assertEqual(movie.get_absolute_url(), '/movie/add/')
+        self.assertEqual(self.client.get(movie.get_absolute_url()).context['movie']['title'], 'Add')
+        self.assertTemplateUsed(self.client.get(reverse('movie_create')), 'movies/movie_form.html')
+
+
+class PosterProcessingTests(MediaTestCase):
+    def test_new_posters_are_processed_off_the_request(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload())
+        self.assertEqual(movie.poster_status, Movie.POSTER_PENDING)
+        self.assertEqual(ImageTask.objects.filter(kind=ImageTask.POSTER, object_id=movie.pk).count(), 1)
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('movie_list')), 'img/poster-placeholder.svg')
+        self.run_image_tasks()
+        movie.refresh_from_db()
+        self.assertEqual(movie.poster_status, Movie.POSTER_READY)
+        self.assertFalse(ImageTask.objects.exists())
+        self.assertNotContains(self.client.get(reverse('movie_list')), 'img/poster-placeholder.svg')
+        # Saving without a new poster queues nothing.
+        movie.title = 'Heat (1995)'
+        movie.save()
+        self.assertFalse(ImageTask.objects.exists())
+
+    def test_unreadable_posters_are_shown_as_unavailable(self):
+        movie = make_movie(self.user, 'Heat', poster=SimpleUploadedFile('poster.png', b'not an image'))
+        self.run_image_tasks()  # retried until it gives up
+        task = ImageTask.objects.get()
+        self.assertEqual((task.status, task.attempts), (ImageTask.FAILED, image_tasks.MAX_ATTEMPTS))
+        self.assertIn('ImageRejected', task.error)
+        movie.refresh_from_db()
+        self.assertEqual(movie.poster_status, Movie.POSTER_FAILED)
+        self.client.force_login(self.user)
+        response = self.client.get(movie.get_absolute_url())
+        self.assertContains(response, 'img/poster-unavailable.svg')
+        self.assertNotContains(response, 'img/poster-placeholder.svg')
+
+
+class ContentAddressedStorageTests(MediaTestCase):
+    def age(self, name, days=2):
+        old = time.time() - days * 24 * 60 * 60
+        os.utime(default_storage.path(name), (old, old))
+
+    def test_identical_uploads_share_one_file(self):
+        first = default_storage.save('posters/a.PNG', ContentFile(b'same bytes'))
+        self.assertRegex(first, r'^posters/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(default_storage.save('posters/b.png', ContentFile(b'same bytes')), first)
+        self.assertNotEqual(default_storage.save('posters/c.png', ContentFile(b'other bytes')), first)
+
+    def test_gc_deletes_only_old_unreferenced_files(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload())
+        orphan = default_storage.save('posters/orphan.png', ContentFile(b'orphan'))
+        young = default_storage.save('posters/young.png', ContentFile(b'young'))
+        self.age(movie.poster.name)
+        self.age(orphan)
+        self.assertEqual(media.collect_garbage(dry_run=True), [orphan])
+        self.assertTrue(default_storage.exists(orphan))
+        self.assertEqual(media.collect_garbage(), [orphan])
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(young))
+        self.assertTrue(default_storage.exists(movie.poster.name))
+
+    def test_gc_keeps_a_file_an_upload_was_just_deduplicated_onto(self):
+        orphan = default_storage.save('posters/orphan.png', ContentFile(b'orphan'))
+        self.age(orphan)
+        # An upload whose row is not committed yet deduplicates onto the orphan.
+        self.assertEqual(default_storage.save('posters/heat.png', ContentFile(b'orphan')), orphan)
+        self.assertEqual(media.collect_garbage(), [])
+        self.assertTrue(default_storage.exists(orphan))
+
+    def test_gc_rechecks_references_after_the_walk(self):
+        orphan = default_storage.save('posters/orphan.png', ContentFile(b'orphan'))
+        self.age(orphan)
+        movie = make_movie(self.user, 'Heat')
+        walk = media.hashed_files
+
+        def walk_then_reference(storage, directory=''):
+            yield from walk(storage, directory)
+            if not directory:
+                # A row pointing at the file is committed while the walk runs.
+                Movie.objects.filter(pk=movie.pk).update(poster=orphan)
+
+        with mock.patch.object(media, 'hashed_files', walk_then_reference):
+            self.assertEqual(media.collect_garbage(), [])
+        self.assertTrue(default_storage.exists(orphan))
+
+
+class PosterPreviewTests(MediaTestCase):
+    def test_preview_is_a_tiny_inline_image(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload(size=(400, 600)))
+        self.run_image_tasks()
+        movie.refresh_from_db()
+        prefix = 'data:image/webp;base64,' if 'webp' in posters.FORMATS else 'data:image/jpeg;base64,'
+        self.assertTrue(movie.poster_lqip.startswith(prefix))
+        self.assertLess(len(movie.poster_lqip), 1000)
+        with Image.open(io.BytesIO(base64.b64decode(movie.poster_lqip[len(prefix):]))) as preview:
+            self.assertEqual(preview.size, (posters.LQIP_WIDTH, 24))
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('movie_list')), 'background: center / cover no-repeat url(data:image/')
+
+    def test_backfill_builds_missing_previews(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload())
+        self.run_image_tasks()
+        Movie.objects.filter(pk=movie.pk).update(poster_lqip='')
+        out = io.StringIO()
+        call_command('build_poster_variants', stdout=out, stderr=io.StringIO())
+        self.assertIn('for 1 movies (0 failed)', out.getvalue())
+        self.assertTrue(Movie.objects.get(pk=movie.pk).poster_lqip)
+        call_command('build_poster_variants', stdout=out)
+        self.assertIn('for 0 movies (0 failed)', out.getvalue())
+
+
+class MediaServingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save('posters/notes.txt', ContentFile(b'0123456789'))
+        self.url = settings.MEDIA_URL + self.name
+
+    def test_hashed_names_are_served_as_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={media.IMMUTABLE_MAX_AGE}', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_other_names_get_a_short_max_age(self):
+        with open(os.path.join(settings.MEDIA_ROOT, 'plain.txt'), 'wb') as file:
+            file.write(b'plain')
+        response = self.client.get(settings.MEDIA_URL + 'plain.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={media.MUTABLE_MAX_AGE}', response['Cache-Control'])
+
+    def test_matching_etag_is_a_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_range_is_a_206(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+    def test_suffix_and_open_ended_ranges(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get(self.url, headers={'Range': 'bytes=8-'})
+        self.assertEqual(response['Content-Range'], 'bytes 8-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'89')
+
+    def test_range_ending_before_it_starts_is_ignored(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=5-3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_range_past_the_end_is_a_416(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_sendfile_leaves_the_bytes_to_the_front_server(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], settings.MEDIA_ACCEL_PREFIX + self.name)
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+
+class StaticAssetTests(MovieTestCase):
+    CSS = b'body { color: #123456; margin: 0 auto; }\n' * 50
+
+    def setUp(self):
+        super().setUp()
+        source, static_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, static_root)
+        with open(os.path.join(source, 'site.css'), 'wb') as file:
+            file.write(self.CSS)
+        with open(os.path.join(source, 'tiny.js'), 'wb') as file:
+            file.write(b'x')
+        static_settings = self.settings(
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_ROOT=static_root,
+            STORAGES={
+                **settings.STORAGES,
+                'staticfiles': {'BACKEND': 'movies_app.assets.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+        assets.hashed_names.cache_clear()
+        self.addCleanup(assets.hashed_names.cache_clear)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.css = assets.staticfiles_storage.stored_name('site.css')
+        self.static_root = static_root
+
+    def test_collectstatic_writes_gzip_siblings_of_hashed_text_files(self):
+        self.assertRegex(self.css, r'^site\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.static_root, self.css + '.gz'), 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), self.CSS)
+        # Compressing one byte only makes it bigger.
+        tiny = assets.staticfiles_storage.stored_name('tiny.js')
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, tiny + '.gz')))
+
+    def test_gzip_sibling_is_served_to_clients_that_accept_it(self):
+        response = self.client.get(settings.STATIC_URL + self.css, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.CSS)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_identity_is_served_when_gzip_is_refused(self):
+        for accept in ('', 'gzip;q=0', 'identity'):
+            with self.subTest(accept=accept):
+                response = self.client.get(settings.STATIC_URL + self.css, headers={'Accept-Encoding': accept})
+                self.assertNotIn('Content-Encoding', response)
+                self.assertEqual(b''.join(response.streaming_content), self.CSS)
+                self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_unhashed_names_get_a_short_max_age(self):
+        response = self.client.get(settings.STATIC_URL + 'site.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={media.MUTABLE_MAX_AGE}', response['Cache-Control'])
+
+    def test_accepted_encodings(self):
+        self.assertEqual(assets.accepted_encodings('gzip, br;q=0.5'), {'gzip', 'br'})
+        self.assertEqual(assets.accepted_encodings('*, gzip;q=0'), {'*'} | {
+            encoding for encoding, suffix in assets.ENCODINGS if encoding != 'gzip'})
+        self.assertEqual(assets.accepted_encodings('GZIP ; q=0.0'), set())
+
+
+class AvatarTests(MediaTestCase):
+    def render_avatar(self, variants, preset='small'):
+        template = Template('{% load movie_tags %}{% avatar_img variants "alice" preset %}')
+        return template.render(Context({'variants': variants, 'preset': preset}))
+
+    def test_avatars_get_square_variants_off_the_request(self):
+        profile = self.user.profile
+        profile.avatar = image_upload('me.png', size=(120, 90))
+        profile.save()
+        self.assertEqual(profile.avatar_variants, {})
+        self.assertEqual(ImageTask.objects.filter(kind=ImageTask.AVATAR, object_id=profile.pk).count(), 1)
+        self.run_image_tasks()
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_variants['source'], profile.avatar.name)
+        # Never upscaled past the 90px short side.
+        self.assertEqual(sorted(profile.avatar_variants['sizes'], key=int), ['40', '80', '90'])
+        for size, path in profile.avatar_variants['sizes'].items():
+            with default_storage.open(path) as file, Image.open(file) as image:
+                self.assertEqual(image.size, (int(size), int(size)))
+        self.assertFalse(ImageTask.objects.exists())
+
+    def test_avatar_img_shows_the_initial_until_variants_exist(self):
+        html = self.render_avatar({})
+        self.assertIn('avatar-initial', html)
+        self.assertIn('>A</span>', html)
+        self.assertNotIn('<img', html)
+
+    def test_avatar_img_offers_the_next_size_up_for_2x_screens(self):
+        variants = {'source': 'avatars/me.png', 'sizes': {'40': 'a/40.webp', '80': 'a/80.webp', '160': 'a/160.webp'}}
+        html = self.render_avatar(variants)
+        self.assertIn(f'src="{settings.MEDIA_URL}a/40.webp"', html)
+        self.assertIn(f'srcset="{settings.MEDIA_URL}a/40.webp 1x, {settings.MEDIA_URL}a/80.webp 2x"', html)
+        self.assertIn('width="40"', html)
+        # The largest variant stands in when none is big enough.
+        html = self.render_avatar({'sizes': {'40': 'a/40.webp'}}, 'large')
+        self.assertIn(f'src="{settings.MEDIA_URL}a/40.webp"', html)
+        self.assertNotIn('srcset', html)
+
+    def test_new_avatar_drops_old_variants_and_cached_pages(self):
+        movie = make_movie(self.user, 'Heat')
+        Comment.objects.create(movie=movie, user=self.user, content='Great')
+        profile = self.user.profile
+        profile.avatar_variants = {'source': 'avatars/old.png', 'sizes': {'40': 'avatars/variants/old-40.webp'}}
+        profile.save()
+        version = caching.movie_version(movie.slug)
+        profile.avatar = image_upload('me.png')
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_variants, {})
+        self.assertNotEqual(caching.movie_version(movie.slug), version)
+
+    def test_unreadable_avatars_keep_the_initial(self):
+        profile = self.user.profile
+        profile.avatar = SimpleUploadedFile('me.png', b'not an image')
+        profile.save()
+        self.run_image_tasks()
+        task = ImageTask.objects.get()
+        self.assertEqual((task.status, task.attempts), (ImageTask.FAILED, image_tasks.MAX_ATTEMPTS))
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_variants, {})
+        self.assertIn('avatar-initial', self.render_avatar(profile.avatar_variants))
+
+
+class ImagingSandboxTests(MediaTestCase):
+    def png(self, size=(40, 60), mode='RGB'):
+        buffer = io.BytesIO()
+        Image.new(mode, size).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def test_inspect_reads_bytes_and_paths(self):
+        data = self.png()
+        path = os.path.join(settings.MEDIA_ROOT, 'poster.png')
+        with open(path, 'wb') as file:
+            file.write(data)
+        for source in (data, path):
+            info = imaging.run(imaging.inspect, source)
+            self.assertEqual(info, {'format': 'PNG', 'content_type': 'image/png', 'width': 40, 'height': 60})
+
+    def test_garbage_is_rejected(self):
+        with self.assertRaises(imaging.ImageRejected) as caught:
+            imaging.run(imaging.inspect, b'not an image')
+        self.assertNotIsInstance(caught.exception, imaging.ImageTooLarge)
+
+    def test_decompression_bombs_are_too_large(self):
+        # Within twice MAX_IMAGE_PIXELS, where Pillow only warns.
+        bomb = self.png((10000, 6000), mode='1')
+        with self.assertRaises(imaging.ImageTooLarge):
+            imaging.run(imaging.inspect, bomb)
+
+    def test_oversized_files_are_refused_before_starting_a_child(self):
+        with mock.patch.object(imaging, 'MAX_FILE_BYTES', 10), \
+                mock.patch.object(imaging._context, 'Process') as process:
+            with self.assertRaises(imaging.ImageTooLarge):
+                imaging.run(imaging.inspect, self.png())
+        process.assert_not_called()
+
+    def test_unsupported_rlimits_do_not_reject_images(self):
+        conn = mock.Mock()
+        unsupported = mock.Mock(setrlimit=mock.Mock(side_effect=ValueError))
+        with mock.patch.object(imaging, 'resource', unsupported), \
+                mock.patch.object(Image, 'MAX_IMAGE_PIXELS', Image.MAX_IMAGE_PIXELS), \
+                warnings.catch_warnings():
+            imaging._child(conn, imaging.inspect, (self.png(),))
+        status, info = conn.send.call_args.args[0]
+        self.assertEqual((status, info['width']), ('ok', 40))
+
+    def test_uploads_on_disk_are_decoded_from_their_path(self):
+        upload = TemporaryUploadedFile('me.png', 'image/png', 0, None)
+        upload.write(self.png())
+        upload.size = upload.tell()
+        upload.seek(0)  # as TemporaryFileUploadHandler leaves it
+        self.addCleanup(upload.close)
+        with mock.patch.object(imaging, 'run', wraps=imaging.run) as run:
+            form = ProfileForm(data={'bio': ''}, files={'avatar': upload})
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(run.call_args.args[1], upload.temporary_file_path())
+
+    def test_oversized_uploads_are_refused(self):
+        with mock.patch.object(imaging, 'MAX_FILE_BYTES', 10):
+            form = ProfileForm(data={'bio': ''}, files={'avatar': image_upload('me.png')})
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['avatar'][0].code, 'image_too_large')
+
+    def post_movie(self, url, poster):
+        return self.client.post(url, {
+            'title': 'Heat', 'poster': poster, 'description': 'A film', 'release_date': '1995-12-15',
+            'actors': 'Al Pacino', 'rating': '8.3', 'category': self.drama.pk, 'trailer_url': '',
+        })
+
+    def test_movie_views_decode_posters_in_the_sandbox(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(imaging, 'run', wraps=imaging.run) as run:
+            response = self.post_movie(reverse('movie_create'), image_upload())
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(run.call_args.args[0], imaging.inspect)
+        movie = Movie.objects.get(title='Heat')
+        with mock.patch.object(imaging, 'run', wraps=imaging.run) as run:
+            response = self.post_movie(reverse('movie_update', args=[movie.slug]), image_upload('new.png'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(run.call_args.args[0], imaging.inspect)
+
+    def test_movie_create_refuses_garbage_and_bombs(self):
+        self.client.force_login(self.user)
+        garbage = SimpleUploadedFile('poster.png', b'not an image')
+        bomb = SimpleUploadedFile('poster.png', self.png((10000, 6000), mode='1'))
+        for poster, code in ((garbage, 'invalid_image'), (bomb, 'image_too_large')):
+            with self.subTest(code=code):
+                response = self.post_movie(reverse('movie_create'), poster)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['form'].errors.as_data()['poster'][0].code, code)
+        self.assertFalse(Movie.objects.exists())
+
+
+def run_in_other_process(func, *args, **kwargs):
+    """Call ``func`` in a forked child, which has its own copy of any in-process state."""
+    process = multiprocessing.get_context('fork').Process(target=func, args=args, kwargs=kwargs)
+    process.start()
+    process.join()
+    return process.exitcode
+
+
+@skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+class WorkerCacheTests(MediaTestCase):
+    """The image worker is its own process: pages must see its cache writes."""
+    # The project's cache, read before MovieTestCase swaps in its own.
+    SHIPPED_CACHE = settings.CACHES['default']
+
+    def setUp(self):
+        super().setUp()
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        cache_settings = self.settings(CACHES={'default': {**self.SHIPPED_CACHE, 'LOCATION': location}})
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+    def test_pages_follow_posters_processed_by_the_worker(self):
+        movie = make_movie(self.user, 'Heat', poster=image_upload())
+        self.client.force_login(self.user)
+        response = self.client.get(movie.get_absolute_url())
+        self.assertContains(response, 'img/poster-placeholder.svg')
+        detail_etag = response['ETag']
+        list_etag = self.client.get(reverse('movie_list'))['ETag']
+        # The database work runs here, but the worker's cache writes are made
+        # from another process, as they are in production.
+        with mock.patch.object(posters, 'caching') as worker_caching:
+            self.run_image_tasks()
+        self.assertTrue(worker_caching.method_calls)
+        for name, args, kwargs in worker_caching.method_calls:
+            self.assertEqual(run_in_other_process(getattr(caching, name), *args, **kwargs), 0)
+        response = self.client.get(movie.get_absolute_url(), headers={'If-None-Match': detail_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'img/poster-placeholder.svg')
+        response = self.client.get(reverse('movie_list'), headers={'If-None-Match': list_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'img/poster-placeholder.svg')
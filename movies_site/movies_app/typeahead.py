@@ -0,0 +1,211 @@
+"""
+In-process prefix index used by the search-box autocomplete endpoint.
+
+Every completion (a movie title, an actor or a category name) is inserted into
+a character trie under each of its word starts, so "knig" completes "The Dark
+Knight".  Each trie node keeps its own top-k list, which makes a lookup a walk
+down the prefix followed by a slice, independent of catalogue size.
+
+The index lives in the memory of each worker process.  It is built lazily on
+the first lookup and patched incrementally by the signal handlers in
+``signals.py`` for changes made through the same process.  It also records the
+catalogue version it reflects, so a change made by another worker (which
+bumps the shared version) makes every other worker rebuild on its next
+lookup.  Favorite counts only move popularity in the worker that saw them;
+the next rebuild picks up the rest.
+"""
+import threading
+
+from . import caching
+from .models import Category, Movie
+
+TOP_K = 10
+
+# Bounds on what one completion adds to the trie: it is found from its first
+# few word starts, and only the first characters of each key are indexed.
+MAX_WORD_STARTS = 4
+MAX_KEY_LENGTH = 32
+
+TITLE = 'title'
+ACTOR = 'actor'
+CATEGORY = 'category'
+
+
+def split_actors(actors):
+    return [name.strip() for name in actors.split(',') if name.strip()]
+
+
+def normalize_prefix(text):
+    return ' '.join(text.lower().split())[:MAX_KEY_LENGTH]
+
+
+def prefix_keys(label):
+    words = label.lower().split()
+    return {normalize_prefix(' '.join(words[i:])) for i in range(min(len(words), MAX_WORD_STARTS))}
+
+
+def movie_terms(title, actors, category_name):
+    terms = {(TITLE, title)}
+    terms.update((ACTOR, actor) for actor in split_actors(actors))
+    if category_name:
+        terms.add((CATEGORY, category_name))
+    return terms
+
+
+class _Node:
+    __slots__ = ('children', 'terms', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.terms = set()  # completions whose key ends at this node
+        self.top = []       # best (term, score) pairs of this subtree
+
+
+class PrefixIndex:
+    def __init__(self, top_k=TOP_K, version=None):
+        self.top_k = top_k
+        self.version = version  # catalogue version the index reflects
+        self._root = _Node()
+        self._scores = {}   # term -> popularity
+        self._owners = {}   # ('movie' | 'category', pk) -> (popularity, terms)
+        self._lock = threading.Lock()
+
+    def complete(self, prefix, limit=TOP_K):
+        node = self._root
+        for char in normalize_prefix(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.top[:limit]
+
+    # Owners are the rows a completion comes from.  A term's popularity is the
+    # sum of the popularity of every owner that currently contributes it.
+    def set_owner(self, owner, terms, popularity=1):
+        with self._lock:
+            old_popularity, old_terms = self._owners.pop(owner, (0, set()))
+            for term in old_terms:
+                self._add_score(term, -old_popularity)
+            if terms:
+                self._owners[owner] = (popularity, set(terms))
+                for term in terms:
+                    self._add_score(term, popularity)
+
+    def remove_owner(self, owner):
+        self.set_owner(owner, ())
+
+    def adjust_popularity(self, owner, delta):
+        with self._lock:
+            if owner not in self._owners:
+                return
+            popularity, terms = self._owners[owner]
+            self._owners[owner] = (popularity + delta, terms)
+            for term in terms:
+                self._add_score(term, delta)
+
+    def _add_score(self, term, delta):
+        score = self._scores.get(term, 0) + delta
+        if score > 0:
+            self._scores[term] = score
+        else:
+            self._scores.pop(term, None)
+        for key in prefix_keys(term[1]):
+            self._update_path(key, term, present=score > 0)
+
+    def _update_path(self, key, term, present):
+        path = [self._root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                if not present:
+                    return
+                node = path[-1].children[char] = _Node()
+            path.append(node)
+        if present:
+            path[-1].terms.add(term)
+        else:
+            path[-1].terms.discard(term)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            self._recompute_top(node)
+            if depth and not node.terms and not node.children:
+                del path[depth - 1].children[key[depth - 1]]
+
+    def _recompute_top(self, node):
+        candidates = {term: self._scores[term] for term in node.terms}
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = sorted(candidates.items(), key=lambda item: (-item[1], item[0][1]))[:self.top_k]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    version = caching.catalogue_version()
+    if _index is None or _index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = build_index()
+    return _index
+
+
+def build_index():
+    # Read the version first: a change made during the build leaves the
+    # index older than the version, so it is rebuilt again.
+    index = PrefixIndex(version=caching.catalogue_version())
+    for pk, name in Category.objects.values_list('pk', 'name'):
+        index.set_owner((CATEGORY, pk), {(CATEGORY, name)})
+    movies = Movie.objects.values_list('pk', 'title', 'actors', 'category__name', 'favorite_count')
+    for pk, title, actors, category_name, favorites in movies:
+        index.set_owner(('movie', pk), movie_terms(title, actors, category_name), 1 + favorites)
+    return index
+
+
+# ----------------------
+# Incremental updates, called from signals.py
+# ----------------------
+def movie_saved(movie):
+    if _index is None:
+        return
+    category_name = movie.category.name if movie.category_id else ''
+    _index.set_owner(
+        ('movie', movie.pk), movie_terms(movie.title, movie.actors, category_name), 1 + movie.favorite_count)
+
+
+def movie_deleted(movie_id):
+    if _index is not None:
+        _index.remove_owner(('movie', movie_id))
+
+
+def movies_recategorized(movie_ids):
+    if _index is None:
+        return
+    for movie in Movie.objects.filter(pk__in=movie_ids).select_related('category'):
+        movie_saved(movie)
+
+
+def category_saved(category):
+    if _index is not None:
+        _index.set_owner((CATEGORY, category.pk), {(CATEGORY, category.name)})
+
+
+def category_deleted(category_id):
+    if _index is not None:
+        _index.remove_owner((CATEGORY, category_id))
+
+
+def favorite_changed(movie_id, delta):
+    if _index is not None:
+        _index.adjust_popularity(('movie', movie_id), delta)
+
+
+def catalogue_changed(version):
+    """
+    The catalogue moved to ``version`` through a change this process has
+    already applied above.  If the index was current just before it, it still
+    is; otherwise another worker changed something too and it is rebuilt.
+    """
+    if _index is not None and _index.version == version - 1:
+        _index.version = version
@@ -26,12 +26,15 @@ path('logout/', auth_views.LogoutView.as_view(next_page='movie_list'), name='log
 
     # Movie list (after login)
     path('movies/', views.MovieListView.as_view(), name='movie_list'),
+    path('movies/feed/', views.MovieFeedView.as_view(), name='movie_feed'),
+
+    # Add Movie (outside movie/<slug>/, so no slug is shadowed)
+    path('movies/add/', views.MovieCreateView.as_view(), name='movie_create'),
 
     # Movie detail
     path('movie/<slug:slug>/', views.MovieDetailView.as_view(), name='movie_detail'),
 
-    # Add / Edit / Delete Movie
-    path('movie/add/', views.MovieCreateView.as_view(), name='movie_create'),
+    # Edit / Delete Movie
     path('movie/<slug:slug>/edit/', views.MovieUpdateView.as_view(), name='movie_update'),
     path('movie/<slug:slug>/delete/', views.MovieDeleteView.as_view(), name='movie_delete'),
 
@@ -40,12 +43,14 @@ path('logout/', auth_views.LogoutView.as_view(next_page='movie_list'), name='log
 
     # Search
     path('search/', views.SearchResultsView.as_view(), name='search_results'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
 
     # User Movies
     path('user/<str:username>/', views.UserMoviesView.as_view(), name='user_movies'),
 
     # Comments
     path('movie/<slug:slug>/comment/add/', views.add_comment, name='add_comment'),
+    path('movie/<slug:slug>/comments/', views.movie_comments, name='movie_comments'),
     path('comment/<int:pk>/delete/', views.delete_comment, name='delete_comment'),
 
     # Favorites
@@ -53,4 +58,7 @@ path('logout/', auth_views.LogoutView.as_view(next_page='movie_list'), name='log
 
     # Dashboard
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+
+    # Metrics (staff only)
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
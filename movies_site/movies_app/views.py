@@ -1,3 +1,5 @@
+import datetime
+
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.views.generic import (
@@ -6,41 +8,165 @@ from django.views.generic import (
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.text import slugify
-from django.db.models import Q
 from django.contrib.auth import login
-from .forms import UserRegisterForm, CommentForm
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.core.exceptions import BadRequest
+from django.core.paginator import Page
+from .forms import UserRegisterForm, CommentForm, MovieForm
+from .cards import MovieCardListMixin, card_queryset, cards, cards_in_order
+from .conditional import CatalogueConditionalMixin, ConditionalGetMixin, make_etag
+from .detail import comment_page, first_comment_page, movie_detail
+from .donut import DonutCacheMixin
+from .favorites import favorite_ids
 from .models import Movie, Category, Comment, Favorite
+from .pagination import CachedCountPaginator, KeysetPaginationMixin, PrecountedPaginator
+from .search import search_movies
+from . import caching, facets, fuzzy, metrics, typeahead
 
 # ----------------------
 # Movie Views
 # ----------------------
-class MovieListView(LoginRequiredMixin, ListView):
+# Every sort, alone or within a category, is served by a matching composite
+# index on Movie.  A year filter is a range on release_date, so it is only
+# index-backed when the list is also sorted by release date.
+MOVIE_LIST_SORTS = {
+    'created': ('Newest', ('-created_at', '-id')),
+    'rating': ('Top rated', ('-rating', '-id')),
+    'release_date': ('Release date', ('-release_date', '-id')),
+    'title': ('Title (A-Z)', ('title', 'id')),
+    'comments': ('Most commented', ('-comment_count', '-id')),
+    'favorites': ('Most favorited', ('-favorite_count', '-id')),
+}
+# Sorts that change with every comment or favorite rather than with the catalogue.
+COUNTER_SORTS = {'comments', 'favorites'}
+
+
+class MovieListView(LoginRequiredMixin, CatalogueConditionalMixin, DonutCacheMixin, MovieCardListMixin, KeysetPaginationMixin, ListView):
     model = Movie
     template_name = 'movies/movie_list.html'
     context_object_name = 'movies'
     paginate_by = 12
 
+    def get_queryset(self):
+        params = self.request.GET
+        self.year = params.get('year', '')
+        self.sort = params.get('sort') or ('release_date' if self.year else 'created')
+        if self.sort not in MOVIE_LIST_SORTS:
+            raise BadRequest('Unsupported sort.')
+        queryset = Movie.objects.all()
+        self.category = None
+        if params.get('category'):
+            self.category = get_object_or_404(Category, slug=params['category'])
+            queryset = queryset.filter(category=self.category)
+        if params.get('user'):
+            # Used by the feed behind UserMoviesView's infinite scroll.
+            queryset = queryset.filter(created_by__username=params['user'])
+        if self.year:
+            if self.sort != 'release_date':
+                raise BadRequest('Filtering by year is only supported when sorting by release date.')
+            try:
+                year = int(self.year)
+                queryset = queryset.filter(
+                    release_date__gte=datetime.date(year, 1, 1),
+                    release_date__lt=datetime.date(year + 1, 1, 1),
+                )
+            except ValueError:
+                raise BadRequest('Invalid year.')
+        return card_queryset(queryset)
+
+    def get_ordering(self):
+        label, ordering = MOVIE_LIST_SORTS[self.sort]
+        return ordering
+
+    def get_skeleton_version(self):
+        if self.request.GET.get('sort') in COUNTER_SORTS:
+            return caching.counters_version()
+        return ''
+
+    def get_etag(self):
+        return make_etag(super().get_etag(), self.get_skeleton_version())
+
+    def get_last_modified(self):
+        if self.request.GET.get('sort') in COUNTER_SORTS:
+            return None
+        return super().get_last_modified()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['sort'] = self.sort
+        context['sort_options'] = [(name, label) for name, (label, ordering) in MOVIE_LIST_SORTS.items()]
+        context['year'] = self.year
+        context['selected_category'] = self.category
+        context['categories'] = Category.objects.all()
+        return context
+
 
-class MovieDetailView(LoginRequiredMixin, DetailView):
+class MovieFeedView(MovieListView):
+    """
+    The next batch of cards after ``?cursor=`` as JSON, for infinite scroll.
+    Only the card partial is rendered: no base template and no context
+    processors.  ``?show_category=0`` matches the cards of pages that leave
+    the category line out.  The request still goes through the full
+    middleware stack: sessions and auth are needed for the login check and
+    the favorite hearts, and the rest is cheap for a GET.
+    """
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        html = render_to_string('movies/_movie_cards.html', {
+            'movies': page.object_list,
+            'show_category': self.request.GET.get('show_category') != '0',
+            'favorite_ids': favorite_ids(self.request.user),
+        })
+        return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
+
+
+class MovieDetailView(LoginRequiredMixin, ConditionalGetMixin, DonutCacheMixin, DetailView):
     model = Movie
     template_name = 'movies/movie_detail.html'
     context_object_name = 'movie'
 
+    def get_etag(self):
+        # The movie version covers the movie, its category, comments and counters.
+        # A slug without one (unknown, or not viewed yet) gets no ETag.
+        version = caching.movie_version(self.kwargs['slug'], create=False)
+        if version is None:
+            return None
+        user_id = self.request.user.pk
+        return make_etag(
+            user_id, caching.favorites_version(user_id), version, self.request.get_full_path(),
+        )
+
+    def get_object(self, queryset=None):
+        self.payload = movie_detail(self.kwargs['slug'])
+        if self.payload is None:
+            raise Http404('No movie found matching the query.')
+        return self.payload['movie']
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['comment_form'] = CommentForm()
-        context['is_favorited'] = False
-        user = self.request.user
-        if user.is_authenticated:
-            context['is_favorited'] = Favorite.objects.filter(user=user, movie=self.object).exists()
+        cursor = self.request.GET.get('cursor')
+        if cursor:
+            context['comments'] = comment_page(self.object['id'], cursor)
+        else:
+            context['comments'] = first_comment_page(self.payload)
         return context
 
+    def get_skeleton_version(self):
+        return caching.movie_version(self.kwargs['slug'], create=False)
+
+    def get_hole_context(self):
+        return {'comment_form': CommentForm()}
+
 
 class MovieCreateView(LoginRequiredMixin, CreateView):
     model = Movie
     template_name = 'movies/movie_form.html'
-    fields = ['title', 'poster', 'description', 'release_date', 'actors', 'rating', 'category', 'trailer_url']
+    form_class = MovieForm
 
     def form_valid(self, form):
         form.instance.created_by = self.request.user
@@ -59,7 +185,7 @@ class MovieOwnerMixin(UserPassesTestMixin):
 class MovieUpdateView(LoginRequiredMixin, MovieOwnerMixin, UpdateView):
     model = Movie
     template_name = 'movies/movie_form.html'
-    fields = ['title', 'poster', 'description', 'release_date', 'actors', 'rating', 'category', 'trailer_url']
+    form_class = MovieForm
 
     def form_valid(self, form):
         messages.success(self.request, 'Movie updated successfully.')
@@ -76,15 +202,15 @@ class MovieDeleteView(LoginRequiredMixin, MovieOwnerMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class MoviesByCategoryView(LoginRequiredMixin, ListView):
+class MoviesByCategoryView(LoginRequiredMixin, CatalogueConditionalMixin, DonutCacheMixin, MovieCardListMixin, KeysetPaginationMixin, ListView):
     model = Movie
-    template_name = 'movies/movies_by_category.html'
+    template_name = 'movies/category.html'
     context_object_name = 'movies'
     paginate_by = 12
 
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs.get('slug'))
-        return Movie.objects.filter(category=self.category)
+        return card_queryset(Movie.objects.filter(category=self.category))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -92,30 +218,81 @@ class MoviesByCategoryView(LoginRequiredMixin, ListView):
         return context
 
 
-class SearchResultsView(LoginRequiredMixin, ListView):
+class SearchResultsView(LoginRequiredMixin, CatalogueConditionalMixin, MovieCardListMixin, ListView):
     model = Movie
-    template_name = 'movies/search_results.html'
+    template_name = 'movies/search_result.html'
     context_object_name = 'movies'
     paginate_by = 12
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
+        # A cache hit carries the page's movie ids, the total count, the
+        # suggestion and the facets, so no search query runs at all.
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        self.cache_key = caching.search_results_key(self.request.GET, page_number)
+        self.cached_results = cache.get(self.cache_key)
+        if self.cached_results is not None:
+            return Movie.objects.none()
+
         query = self.request.GET.get('q', '')
-        return Movie.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(actors__icontains=query) |
-            Q(category__name__icontains=query)
-        ).distinct()
+        self.suggestion = None
+        queryset = search_movies(query)
+        if query.strip() and not queryset.exists():
+            matches = fuzzy.similar_terms(query)
+            if matches:
+                self.suggestion = matches[0][0].text
+                queryset = fuzzy.movies_for_terms([term for term, similarity in matches])
+        return card_queryset(facets.apply_facet_filters(queryset, self.request.GET))
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cached_results is None:
+            return super().paginate_queryset(queryset, page_size)
+        ids = self.cached_results['ids']
+        paginator = PrecountedPaginator(queryset, page_size, count=self.cached_results['count'])
+        object_list = cards_in_order(ids)
+        page = Page(object_list, self.cached_results['number'], paginator)
+        return paginator, page, object_list, paginator.num_pages > 1
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        results = self.cached_results
+        if results is None:
+            page = context['page_obj']
+            results = {
+                'ids': [movie.pk for movie in page.object_list],
+                'number': page.number,
+                'count': page.paginator.count,
+                'suggestion': self.suggestion,
+                'facets': facets.facet_counts(self.object_list, self.request.GET),
+            }
+            cache.set(self.cache_key, results, caching.SEARCH_RESULTS_TIMEOUT)
+        context['suggestion'] = results['suggestion']
+        context['facets'] = results['facets']
+        return context
 
 
-class UserMoviesView(LoginRequiredMixin, ListView):
+@login_required
+def search_suggest(request):
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), typeahead.TOP_K))
+    except ValueError:
+        limit = 8
+    completions = typeahead.get_index().complete(query, limit) if query.strip() else []
+    return JsonResponse({
+        'query': query,
+        'results': [{'value': label, 'kind': kind} for (kind, label), score in completions],
+    })
+
+
+class UserMoviesView(LoginRequiredMixin, CatalogueConditionalMixin, DonutCacheMixin, MovieCardListMixin, KeysetPaginationMixin, ListView):
     model = Movie
     template_name = 'movies/user_movies.html'
     context_object_name = 'movies'
     paginate_by = 12
 
     def get_queryset(self):
-        return Movie.objects.filter(created_by__username=self.kwargs.get('username'))
+        return card_queryset(Movie.objects.filter(created_by__username=self.kwargs.get('username')))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -141,6 +318,15 @@ def add_comment(request, slug):
     return redirect(movie.get_absolute_url())
 
 
+@login_required
+def movie_comments(request, slug):
+    """The page of comments after ``?cursor=`` as JSON, for "load more" on the detail page."""
+    movie = get_object_or_404(Movie.objects.only('id'), slug=slug)
+    page = comment_page(movie.pk, request.GET.get('cursor'))
+    html = render_to_string('movies/_comments.html', {'comments': page}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
+
+
 @login_required
 def delete_comment(request, pk):
     comment = get_object_or_404(Comment, pk=pk)
@@ -188,7 +374,14 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        context['my_movies'] = Movie.objects.filter(created_by=user)
-        context['favorites'] = Movie.objects.filter(favorited_by__user=user)
-        context['recent_comments'] = Comment.objects.filter(user=user)[:10]
+        context['my_movies'] = cards(card_queryset(Movie.objects.filter(created_by=user)))
+        context['favorites'] = cards(card_queryset(Movie.objects.filter(favorited_by__user=user)))
+        context['recent_comments'] = (
+            Comment.objects.filter(user=user).select_related('movie').only('content', 'created_at', 'movie__title', 'movie__slug')[:10]
+        )
         return context
+
+
+@staff_member_required
+def metrics_view(request):
+    return JsonResponse(metrics.snapshot())
@@ -63,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'movies_app.context_processors.favorites',
             ],
         },
     },
@@ -82,6 +83,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Cached pages are validated by versions that the image worker
+# (manage.py process_image_tasks) bumps from its own process, so the cache
+# must be shared between processes.  The file cache is, on one host (the
+# worker needs the same MEDIA_ROOT anyway); use Redis or Memcached when the
+# web and worker processes run on several hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -117,6 +134,7 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]  # your project-level static folder
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')     # for collectstatic in production
+STATIC_ACCEL_PREFIX = '/protected-static/'  # nginx internal location for STATIC_ROOT, see MEDIA_SENDFILE
 
 
 # Default primary key field type
@@ -128,6 +146,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How /media/ and /static/ responses hand the file to the front server (see movies_app/media.py):
+# None sends it from Django (os.sendfile under gunicorn), 'x-accel-redirect' for
+# nginx, 'x-sendfile' for Apache mod_xsendfile.
+MEDIA_SENDFILE = None
+# nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Uploads are stored under the SHA-256 of their content; see movies_app/storage.py.
+STORAGES = {
+    'default': {'BACKEND': 'movies_app.storage.ContentAddressedStorage'},
+    # collectstatic writes content-hashed names plus .gz/.br copies; see movies_app/assets.py.
+    'staticfiles': {'BACKEND': 'movies_app.assets.CompressedManifestStaticFilesStorage'},
+}
+
 LOGIN_URL = '/'  # redirect to login if user not authenticated
 LOGIN_REDIRECT_URL = '/movies/'  # after login, go to movie list
 LOGOUT_REDIRECT_URL = '/'  # after logout, go to login page
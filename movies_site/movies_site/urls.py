@@ -14,15 +14,30 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from movies_app.assets import serve_static
+from movies_app.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('movies_app.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media is served in production too: serve_media answers validators itself and
+# hands the bytes to sendfile or the front server (MEDIA_SENDFILE).
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
+
+# Collected static files (collectstatic) with precompressed variants.  Under
+# runserver with DEBUG the staticfiles app serves /static/ from the app
+# directories before this is reached.
+if not settings.DEBUG:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static, name='static'),
+    ]
\ No newline at end of file